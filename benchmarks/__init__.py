@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  Performance benchmarks for the "protocol" tool                              #
+#                                                                              #
+################################################################################
+
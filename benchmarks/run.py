@@ -0,0 +1,184 @@
+#!/usr/bin/python
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  Runs the benchmark suite, writes the results to a JSON file and compares    #
+#  them against a stored baseline. Any case that got slower than the baseline  #
+#  by more than the configured tolerance is reported and makes the run fail.   #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import argparse
+import json
+import os
+import platform
+import sys
+
+# BENCHMARK CASES
+from benchmarks.suite import get_cases, run_case
+
+# Baseline shipped with the sources
+DEFAULT_BASELINE=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Default allowed slowdown with respect to the baseline (1.0 means twice as slow)
+DEFAULT_TOLERANCE=1.0
+
+
+def parse_tolerances(values):
+    """
+    Parses the values of the --tolerance option. Each value is either a number,
+    which sets the default tolerance, or a PREFIX=NUMBER pair, which sets the
+    tolerance of the benchmarks whose name starts with PREFIX.
+    @return a (default, {prefix: tolerance}) tuple.
+    """
+    default=DEFAULT_TOLERANCE
+    prefixes={}
+    for value in values:
+        prefix, sep, number = value.rpartition("=")
+        if sep:
+            prefixes[prefix]=float(number)
+        else:
+            default=float(number)
+    return default, prefixes
+
+
+def get_tolerance(name, default, prefixes):
+    """
+    @return the tolerance for a benchmark: the one of the longest matching
+    prefix, or the default one.
+    """
+    best=None
+    for prefix in prefixes:
+        if name.startswith(prefix) and (best is None or len(prefix)>len(best)):
+            best=prefix
+    return default if best is None else prefixes[best]
+
+
+def compare(results, baseline, default, prefixes):
+    """
+    Compares a set of results against a baseline and prints a report.
+    @return the list of names of the benchmarks that regressed.
+    """
+    regressions=[]
+    for name in sorted(results):
+        seconds=results[name]
+        if name not in baseline:
+            print("  %-40s %12.3f us   (new)" % (name, seconds*1e6))
+            continue
+        ratio=seconds/baseline[name] if baseline[name]>0 else 1.0
+        tolerance=get_tolerance(name, default, prefixes)
+        status=""
+        if ratio>1.0+tolerance:
+            status="REGRESSION"
+            regressions.append(name)
+        print("  %-40s %12.3f us %7.2fx %s" % (name, seconds*1e6, ratio, status))
+    return regressions
+
+
+def main():
+    """
+    Runs the benchmark suite and compares it against the baseline.
+    """
+    parser=argparse.ArgumentParser(description="Benchmark suite for Protocol")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results to this JSON file")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON file to compare against (default: %(default)s)")
+    parser.add_argument("-t", "--tolerance", action="append", default=[],
+                        help="allowed slowdown, e.g. 0.5 for 50%% (default: 1.0). Use PREFIX=VALUE to "
+                             "set it for the benchmarks whose name starts with PREFIX")
+    parser.add_argument("-k", "--filter", default="",
+                        help="only run the cases whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.02,
+                        help="minimum duration of each timing loop, in seconds")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timing loops per benchmark")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline instead of comparing")
+    args=parser.parse_args()
+
+    results={}
+    for case in get_cases():
+        if args.filter in case.name:
+            results.update(run_case(case, args.min_time, args.repeat))
+
+    document={"python":platform.python_version(),
+              "implementation":platform.python_implementation(),
+              "machine":platform.machine(),
+              "results":results}
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=1, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=1, sort_keys=True)
+        print("Baseline written to %s" % args.baseline)
+        return
+
+    baseline={}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline=json.load(f)["results"]
+    else:
+        print("No baseline found at %s, nothing to compare against" % args.baseline)
+
+    default, prefixes = parse_tolerances(args.tolerance)
+    regressions=compare(results, baseline, default, prefixes)
+    if len(regressions)>0:
+        print("")
+        print("ERROR: %i benchmark(s) slower than the baseline:" % len(regressions))
+        for name in regressions:
+            print("  %s" % name)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  Scaling benchmark for the row builder. It renders synthetic headers of      #
+#  growing width and growing number of fields, both from left to right and in  #
+#  -lsb mode, and reports the render time per bit and per field, which should  #
+#  stay flat as the inputs grow.                                               #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import sys
+import time
+
+# IMPORT PROTOCOL
+import protocol_graph as protocol
+from benchmarks.suite import synthetic_spec, clear_rows
+
+# Line widths and field counts we render
+BITS_PER_LINE=[32, 64, 128, 256, 512, 1024]
+FIELD_COUNTS=[250, 500, 1000, 2000, 4000, 8000]
+
+# Number of rows rendered by the bits per line family
+ROWS=64
+
+# Largest acceptable growth of the per-unit time between the smallest and
+# the largest input of a family
+MAX_GROWTH=2.0
+
+
+def time_render(proto, repeat=5):
+    """
+    @return the best wall time, in seconds, out of several renders of the
+    supplied protocol. Memoized rows are dropped before each render, so rows
+    are built every time instead of being found in the row table.
+    """
+    best=None
+    for i in range(0, repeat):
+        clear_rows(proto)
+        start=time.perf_counter()
+        str(proto)
+        elapsed=time.perf_counter()-start
+        if best is None or elapsed<best:
+            best=elapsed
+    return best
+
+
+def scale_bits_per_line(left_to_right):
+    """
+    @return a list of (bits_per_line, seconds) tuples for diagrams with a fixed
+    number of rows and growing line widths.
+    """
+    results=[]
+    for bits in BITS_PER_LINE:
+        # Fields are four bits long on average
+        proto=protocol.Protocol(synthetic_spec(bits*ROWS//4, bits))
+        proto.do_left_to_right_print=left_to_right
+        results.append((bits, time_render(proto)))
+    return results
+
+
+def scale_field_count(left_to_right):
+    """
+    @return a list of (fields, seconds) tuples for diagrams with a growing
+    number of fields.
+    """
+    results=[]
+    for fields in FIELD_COUNTS:
+        proto=protocol.Protocol(synthetic_spec(fields))
+        proto.do_left_to_right_print=left_to_right
+        results.append((fields, time_render(proto)))
+    return results
+
+
+def report(name, results):
+    """
+    Prints the results of a scaling family.
+    @return the growth of the time per unit between the first and the last
+    input of the family.
+    """
+    print(name)
+    first=results[0][1]/results[0][0]
+    for size, seconds in results:
+        print("  %8i  %10.3f ms  %8.3f us/unit" % (size, seconds*1e3, seconds/size*1e6))
+    growth=(results[-1][1]/results[-1][0])/first
+    print("  growth: %.2fx" % growth)
+    return growth
+
+
+def main():
+    """
+    Runs every scaling family and exits with a non-zero status if the time per
+    unit grows more than MAX_GROWTH times in any of them.
+    """
+    ok=True
+    for left_to_right in (True, False):
+        direction="msb" if left_to_right else "lsb"
+        ok&=report("bits per line (%s)" % direction, scale_bits_per_line(left_to_right))<=MAX_GROWTH
+        ok&=report("field count (%s)" % direction, scale_field_count(left_to_right))<=MAX_GROWTH
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
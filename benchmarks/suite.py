@@ -0,0 +1,181 @@
+#!/usr/bin/python
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  Benchmark cases for the "protocol" tool. Every entry in specs.protocols and #
+#  a number of synthetic scaling families are timed in three phases: spec      #
+#  parsing, layout and rendering.                                              #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import time
+from collections import namedtuple
+
+# IMPORT PROTOCOL
+import protocol_graph as protocol
+from protocol_graph.layout import compile_layout
+
+# Benchmark phases
+PHASES=["parse", "layout", "render"]
+
+
+class Case(namedtuple("Case", ["name", "spec", "options"])):
+    """
+    This class represents a benchmark case: a spec and the render options it
+    is rendered with (a mapping suitable for Protocol.set_options()).
+    """
+    __slots__ = ()
+
+
+def synthetic_spec(fields, bits=None):
+    """
+    @return a spec with the supplied number of fields, of lengths between
+    one and seven bits.
+    """
+    spec=",".join(["F%i:%i" % (i, 1+i%7) for i in range(0, fields)])
+    if bits is not None:
+        spec+="?bits=%i" % bits
+    return spec
+
+
+def clear_rows(proto):
+    """
+    Drops the rows memoized by the render tables the supplied protocol uses,
+    so its next render builds every row again.
+    """
+    options=proto.get_options()
+    protocol.get_tables(options.bits_per_line, options.ph_num_per_bit, options.hdr_char_start,
+                        options.hdr_char_end, options.hdr_char_fill_odd, options.hdr_char_fill_even,
+                        options.do_left_to_right_print).clear_rows()
+
+
+def get_cases():
+    """
+    @return the list of benchmark cases: every protocol in specs.protocols
+    plus the synthetic scaling families.
+    """
+    cases=[]
+    for name in sorted(protocol.specs.protocols):
+        cases.append(Case("catalog/%s" % name, protocol.specs.protocols[name], {}))
+
+    # Number of fields
+    for fields in (1000, 4000, 16000):
+        cases.append(Case("fields/%i" % fields, synthetic_spec(fields), {}))
+        cases.append(Case("fields/%i/lsb" % fields, synthetic_spec(fields), {"do_left_to_right_print":False}))
+
+    # Bits per line, for a fixed number of rows
+    for bits in (32, 128, 512, 1024):
+        cases.append(Case("bits/%i" % bits, synthetic_spec(bits*16, bits), {}))
+        cases.append(Case("bits/%i/lsb" % bits, synthetic_spec(bits*16, bits), {"do_left_to_right_print":False}))
+
+    # Placeholders per bit
+    for ph in (1, 2, 4, 8):
+        cases.append(Case("placeholder/%i" % ph, synthetic_spec(1000), {"ph_num_per_bit":ph}))
+
+    # Long fields spanning many rows, both aligned to the start of a line
+    # and split across lines
+    for bits in (4096, 65536, 1048576):
+        cases.append(Case("multirow/%i" % bits, "Header:32,Payload:%i" % bits, {}))
+        cases.append(Case("multirow/%i/split" % bits, "Header:16,Payload:%i" % bits, {}))
+    return cases
+
+
+def measure(function, min_time, repeat):
+    """
+    Times a function. The function is called in a loop long enough to take at
+    least min_time seconds, and the loop is repeated several times.
+    @return the best time per call, in seconds.
+    """
+    # Find out how many calls we need per loop
+    number=1
+    while True:
+        start=time.perf_counter()
+        for i in range(0, number):
+            function()
+        elapsed=time.perf_counter()-start
+        if elapsed>=min_time:
+            break
+        number*=2
+
+    best=elapsed/number
+    for i in range(1, repeat):
+        start=time.perf_counter()
+        for j in range(0, number):
+            function()
+        best=min(best, (time.perf_counter()-start)/number)
+    return best
+
+
+def run_case(case, min_time=0.02, repeat=5):
+    """
+    Times the three phases of a benchmark case.
+    @return a dictionary that maps "<case name>/<phase>" to the best time per
+    call, in seconds.
+    """
+    def parse():
+        return protocol.Protocol(case.spec)
+
+    proto=parse()
+    proto.set_options(case.options)
+    fields=proto.field_list
+    bits=proto.bits_per_line
+
+    def layout():
+        return compile_layout(fields, bits)
+
+    def render():
+        # Rows would otherwise come from the row table of the previous call
+        clear_rows(proto)
+        return str(proto)
+
+    render()
+    return {"%s/parse" % case.name: measure(parse, min_time, repeat),
+            "%s/layout" % case.name: measure(layout, min_time, repeat),
+            "%s/render" % case.name: measure(render, min_time, repeat)}
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  Thread scaling benchmark. A single Protocol object is rendered concurrently #
+#  from a growing number of threads, each of them with its own options, and    #
+#  the throughput is compared with the single-threaded one. On free-threaded   #
+#  (no-GIL) CPython builds, throughput should grow almost linearly with the    #
+#  number of threads, up to the number of cores.                               #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# IMPORT PROTOCOL
+import protocol_graph as protocol
+from benchmarks.suite import synthetic_spec
+
+# Thread counts we try, capped to the number of cores
+THREAD_COUNTS=[1, 2, 4, 8, 16]
+
+# Number of renders done by each thread
+RENDERS_PER_THREAD=20
+
+# Number of fields of the rendered protocol
+FIELDS=2000
+
+# Smallest acceptable efficiency (speedup divided by number of threads) on
+# free-threaded builds
+MIN_EFFICIENCY=0.7
+
+
+def gil_enabled():
+    """
+    @return False on free-threaded CPython builds running without the GIL,
+    True otherwise.
+    """
+    check=getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
+
+
+def render_loop(proto, options):
+    """
+    Renders the supplied protocol RENDERS_PER_THREAD times, with the supplied
+    options, and checks every result is the expected one.
+    """
+    expected=proto.render(options)
+    for i in range(0, RENDERS_PER_THREAD):
+        if proto.render(options)!=expected:
+            raise AssertionError("Concurrent renders produced different diagrams")
+
+
+def time_threads(proto, threads):
+    """
+    @return the number of renders per second achieved by the supplied number
+    of threads rendering the same protocol at once.
+    """
+    # Each thread renders with its own separator character, so no two
+    # threads share a cached row, but with the same number of bits per line,
+    # so they share the layout
+    variants=[{"hdr_char_sep": chr(0x2500+i), "do_left_to_right_print": i%2==0} for i in range(0, threads)]
+    for options in variants:
+        proto.render(options)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start=time.perf_counter()
+        for future in [pool.submit(render_loop, proto, options) for options in variants]:
+            future.result()
+        elapsed=time.perf_counter()-start
+    return threads*(RENDERS_PER_THREAD+1)/elapsed
+
+
+def main():
+    """
+    Runs the benchmark and prints the throughput and efficiency for each
+    number of threads. On free-threaded builds, exits with a non-zero status
+    if the efficiency falls below MIN_EFFICIENCY.
+    """
+    proto=protocol.Protocol(synthetic_spec(FIELDS))
+    cores=os.cpu_count() or 1
+    counts=[count for count in THREAD_COUNTS if count<=cores] or [1]
+    gil=gil_enabled()
+    print("threads (%s, %i cores)" % ("GIL enabled" if gil else "free-threaded", cores))
+    base=None
+    ok=True
+    for count in counts:
+        throughput=time_threads(proto, count)
+        if base is None:
+            base=throughput
+        efficiency=throughput/base/count
+        print("  %4i  %10.1f renders/s  %6.2fx  efficiency %.2f" % (count, throughput, throughput/base, efficiency))
+        ok&=gil or efficiency>=MIN_EFFICIENCY
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -62,6 +62,18 @@ from datetime import date
 from protocol_graph.constants import *
 from protocol_graph.exceptions import *
 from protocol_graph import specs
+from protocol_graph.fields import Field, FieldList, FieldPosition, FieldIndex
+from protocol_graph.layout import Fragment, Row, Placement, Layout, compile_layout, relayout, iter_placements
+from protocol_graph.tables import RenderTables, get_tables
+from protocol_graph.rows import Measurement, iter_lines, iter_window_lines, iter_encoded, measure_fields
+from protocol_graph.limits import RenderLimits, NO_LIMITS, estimate_size
+from protocol_graph.options import RenderOptions, DEFAULT_OPTIONS, CANONICAL_CHARS, parse_options
+from protocol_graph.formats import Renderer, AsciiRenderer, register_renderer, get_renderer, parse_formats, renderers, iter_ndjson
+from protocol_graph.cache import CacheStats, RenderCache, render_cache, render, render_formats
+from protocol_graph.batch import render_many, iter_render_many
+from protocol_graph.template import RenderTemplate, compile_template, get_template, template_cache
+from protocol_graph.tokenizer import SpecTokenizer, parse_field
+from protocol_graph import aio
 
 
 class Protocol():
@@ -69,34 +81,87 @@ class Protocol():
     This class represents a network protocol header. Objects are constructed by
     passing a textual protocol specification. Once that is done, instances
     can be printed by converting them to a str type.
+    Render options are kept in a single RenderOptions instance, which is
+    replaced as a whole when some option changes, and rendering never
+    modifies the object, so a Protocol can be rendered from several threads
+    at once. Changing the spec (parse_spec(), update()) while other threads
+    render it is not supported.
     """
 
-    def __init__(self, spec):
+    def __init__(self, spec, limits=None):
         """
         Class constructor.
         @param spec is the textual specification that describes the protocol.
+        @param limits is an optional RenderLimits instance with the resources
+        the protocol may use. By default, there are no limits.
         """
-        self.hdr_char_start="+"                # Character for start of the border line
-        self.hdr_char_end="+"                  # Character for end of the border line
-        self.hdr_char_fill_odd="+"             # Fill character for border odd positions
-        self.hdr_char_fill_even="-"            # Fill character for border even positions
-        self.hdr_char_sep="|"                  # Field separator character
-        self.bits_per_line=32                  # Number of bits per line
-        self.ph_num_per_bit= 1                 # Placeholder Num Per Bits
-        self.do_print_top_tens=True            # True: print top numbers for bit tens
-        self.do_print_top_units=True           # True: print top numbers for bit units
-        self.do_left_to_right_print=True       # True: print field from left to right dirction
-        self.field_list=[]                     # Header fields to be printed out
+        self._setup(limits)
         self.parse_spec(spec)                  # Parse the received spec and populate self.field_list
 
 
+    def _setup(self, limits):
+        """
+        Sets the initial state of the object: default options and no fields.
+        """
+        self._options=DEFAULT_OPTIONS          # Render options (see RenderOptions)
+        self.field_list=FieldList()            # Header fields to be printed out
+        self._layouts={}                       # Compiled layouts, indexed by bits per line and blocks
+        self._index=None                       # Bit offset index of the fields, built on demand
+        self.limits=NO_LIMITS if limits is None else limits
+
+
+    @classmethod
+    def from_stream(cls, fp, limits=None, chunk_size=TOKENIZER_CHUNK_SIZE):
+        """
+        Creates a protocol from a spec read from a text stream. The spec is
+        read in chunks and its fields are validated as they are read, so
+        parsing never holds the whole spec, or the list of its items, in
+        memory. A trailing newline is ignored.
+        @param fp is a file-like object opened in text mode.
+        @param limits is an optional RenderLimits instance, as in Protocol().
+        @param chunk_size is the number of characters read at once.
+        @return a Protocol instance.
+        @raise ProtocolException in case the spec is not valid
+        @raise ProtocolLimitException if the spec has too many fields.
+        """
+        proto=cls.__new__(cls)
+        proto._setup(limits)
+        tokens=SpecTokenizer(fp, chunk_size, proto.limits)
+        proto.field_list=FieldList.from_fields(tokens)
+        if tokens.options is not None:
+            proto.set_options(tokens.options)
+        return proto
+
+
     def parse_spec(self, spec):
         """
         Parses a textual protocol spec and stores the relevant internal state
         so such spec can be later converted to a nice ASCII diagram.
-        @return the list of protocol fields, as a dictionary containing
-        keys 'len' and 'text'. The list is returned for completeness but no
-        caller is expected to store or use such list.
+        @return the list of protocol fields, as a FieldList of Field records
+        with attributes 'text' and 'len'. The list is returned for completeness
+        but no caller is expected to store or use such list.
+        @raise ProtocolException in case the supplied spec is not valid
+        """
+        fields, options=self._parse_fields(spec, len(self.field_list))
+        self.field_list=self.field_list+fields
+
+        # Parse options
+        if options is not None:
+            self.set_options(options)
+
+        # Any layout or index we built before is now stale
+        self._layouts={}
+        self._index=None
+        return self.field_list
+
+
+    def _parse_fields(self, spec, existing=0):
+        """
+        Parses a textual protocol spec without storing anything.
+        @param existing is the number of fields the protocol already has, so
+        the field limit applies to the total.
+        @return a (fields, options) tuple, with a FieldList and the options
+        of the spec, as returned by parse_options(), or None if it has none.
         @raise ProtocolException in case the supplied spec is not valid
         """
         if "?" in spec:
@@ -109,7 +174,12 @@ class Protocol():
             fields=spec
             opts=None
 
+        # Refuse specs with too many fields before we even split them
+        self.limits.check_fields(existing+fields.count(",")+1)
+
         # Parse field spec
+        texts=[]
+        lengths=[]
         items=fields.split(",")
         for item in items:
             try:
@@ -121,47 +191,91 @@ class Protocol():
                 raise
             except:
                 raise ProtocolException("FATAL: Invalid field_list specification (%s)" %spec)
-            self.field_list.append({"text":text, "len":bits})
+            texts.append(text)
+            lengths.append(bits)
 
         # Parse options
         if opts is not None:
-            opts=opts.split(",")
-            for opt in opts:
-                try:
-                    var, value = opt.split("=")
-                    if var.lower()=="bits":
-                        self.bits_per_line=int(value)
-                        if self.bits_per_line<=0:
-                            raise ProtocolException("FATAL: Invalid value for 'bits' option (%s)" % value)
-                    elif var.lower()=="numbers":
-                        if value.lower() in ["0", "n", "no", "none", "false"]:
-                            self.do_print_top_tens=False
-                            self.do_print_top_units=False
-                        elif value.lower() in ["1", "y", "yes", "none", "true"]:
-                            self.do_print_top_tens=True
-                            self.do_print_top_units=True
-                        else:
-                            raise ProtocolException("FATAL: Invalid value for 'numbers' option (%s)" % value)
-                    elif var.lower() in ["oddchar", "evenchar", "startchar", "endchar", "sepchar"]:
-                        if len(value)>1 or len(value)<=0:
-                            raise ProtocolException("FATAL: Invalid value for '%s' option (%s)" % (var, value))
-                        else:
-                            if var.lower()=="oddchar":
-                                self.hdr_char_fill_odd=value
-                            elif var.lower()=="evenchar":
-                                self.hdr_char_fill_even=value
-                            elif var.lower()=="startchar":
-                                self.hdr_char_start=value
-                            elif var.lower()=="endchar":
-                                self.hdr_char_end=value
-                            elif var.lower()=="sepchar":
-                                self.hdr_char_sep=value
-                except ProtocolException:
-                    raise
-                except:
-                    raise ProtocolException("FATAL: Invalid options specification (%s)" % opt)
+            opts=parse_options(opts)
+        return FieldList(texts, lengths), opts
 
-        return self.field_list
+
+    def update(self, spec):
+        """
+        Replaces the spec of this protocol with a new one, as if the object
+        had been created from it, reusing as much work as possible. The
+        layout of a field only depends on the fields before it, so compiled
+        layouts keep the fragments of the fields the old and new specs have
+        in common at their start, and only the rest is laid out again. Rows
+        that don't change are then found in the row table of the renderer.
+        This is meant for editors that re-render a spec on every change.
+        @param spec is the new textual protocol spec. Render options are set
+        to their defaults, and then to the options in the spec, if any.
+        @return the index of the first field that changed. It equals the
+        number of fields if none did.
+        @raise ProtocolException in case the supplied spec is not valid. The
+        object is left untouched in that case.
+        """
+        fields, options=self._parse_fields(spec)
+        # Not set_options(): it skips None values, like that of elide_rows
+        self._options=DEFAULT_OPTIONS
+        if options is not None:
+            self.set_options(options)
+        changed=self.field_list.common_prefix(fields)
+        if changed<len(fields) or len(fields)!=len(self.field_list):
+            self._layouts={key: relayout(layout, fields, changed, key[1]) for key, layout in self._layouts.items()}
+            self._index=None
+            self.field_list=fields
+        return changed
+
+
+    def __getstate__(self):
+        """
+        Compiled layouts and the offset index are not pickled: they can be
+        rebuilt from the field list, which pickles in a few bytes per field.
+        """
+        state=self.__dict__.copy()
+        state["_layouts"]={}
+        state["_index"]=None
+        return state
+
+
+    def get_options(self):
+        """
+        @return a RenderOptions instance with the options this object is
+        currently configured to render with.
+        """
+        return self._options
+
+
+    def set_options(self, options):
+        """
+        Updates the render options of this object.
+        @param options is a RenderOptions instance or a mapping of option names
+        to values. Entries whose value is None are left untouched.
+        @raise ProtocolException if the options are unknown or not valid.
+        """
+        self._options=self._get_options(options)
+
+
+    def _get_options(self, options=None):
+        """
+        @return the RenderOptions of this object, with the supplied ones on
+        top: a RenderOptions instance or a mapping of option names to values.
+        Entries whose value is None are ignored.
+        @raise ProtocolException if the options are unknown or not valid.
+        """
+        return self._options.updated(options)
+
+
+    def _get_tables(self):
+        """
+        @return the shared RenderTables instance that matches the current
+        geometry and border characters of this object.
+        """
+        return get_tables(self.bits_per_line, self.ph_num_per_bit, self.hdr_char_start,
+                          self.hdr_char_end, self.hdr_char_fill_odd, self.hdr_char_fill_even,
+                          self.do_left_to_right_print)
 
 
     def _get_top_numbers(self):
@@ -172,30 +286,7 @@ class Protocol():
         The returned string is not \n terminated, but it may contain a newline
         character in the middle.
         """
-        lines=["", ""]
-        if self.do_print_top_tens is True:
-            for i in range(0, self.bits_per_line):
-                if str(i)[-1:]=="0":
-                    if self.do_left_to_right_print:
-                        lines[0]+=" "*(self.ph_num_per_bit*2-1)+"%s" %str(i)[0]  #" %s" % str(i)[0]
-                    else:
-                        lines[0]=" "*(self.ph_num_per_bit*2-1)+"%s" % str(i)[0]+lines[0]
-                else:
-                    if self.do_left_to_right_print:
-                        lines[0]+="  "*self.ph_num_per_bit
-                    else:
-                        lines[0]="  "*self.ph_num_per_bit+lines[0]
-            lines[0]+="\n"
-        if self.do_print_top_units is True:
-            for i in range(0, self.bits_per_line):
-                if self.do_left_to_right_print:
-                    lines[1]+=" "*(self.ph_num_per_bit*2-1)+"%s" % str(i)[-1:]
-                else:
-                    lines[1]=" "*(self.ph_num_per_bit*2-1)+"%s" % str(i)[-1:]+lines[1]
-
-            #lines[1]+="\n"
-        result = "".join(lines)
-        return  result if len(result)>0 else None
+        return self._get_tables().top_numbers(self.do_print_top_tens, self.do_print_top_units)
 
 
     def _get_horizontal(self, width=None):
@@ -205,22 +296,7 @@ class Protocol():
         default, if no width is supplied, the line covers the hole length of
         the header.
         """
-        if width is None:
-            width=self.bits_per_line
-        if width<=0:
-            return ""
-        else:
-            if self.do_left_to_right_print:
-                a="%s" % self.hdr_char_start
-                b=(self.hdr_char_fill_even+self.hdr_char_fill_odd)*width*self.ph_num_per_bit
-                c="%s" % (self.hdr_char_end)
-                return a + b[0:-1] + c
-            else:
-                d="  "*(self.bits_per_line-width)*self.ph_num_per_bit
-                a="%s" % self.hdr_char_start
-                b=(self.hdr_char_fill_odd+self.hdr_char_fill_even)*width*self.ph_num_per_bit
-                c="%s" % (self.hdr_char_end)
-                return d+c+b[1:]+a
+        return self._get_tables().horizontal(width)
 
 
     def _get_separator(self, line_end=""):
@@ -231,241 +307,406 @@ class Protocol():
         return self.hdr_char_sep
 
 
+    def compile(self, bits_per_line=None, blocks=False):
+        """
+        Compiles the list of protocol fields into a Layout for the current
+        number of bits per line. Layouts are immutable, so they are computed
+        once and then reused by every subsequent render.
+        @param bits_per_line overrides the number of bits per line this object
+        is configured with.
+        @param blocks lays out the full lines of split fields as a single
+        fragment, as renders that elide blank lines do (see compile_layout()).
+        @return a Layout instance.
+        """
+        if bits_per_line is None:
+            bits_per_line=self.bits_per_line
+        key=(bits_per_line, blocks)
+        layout=self._layouts.get(key)
+        if layout is None:
+            layout=compile_layout(self.field_list, bits_per_line, blocks=blocks)
+            self._layouts[key]=layout
+        return layout
+
+
+    def iter_layout(self, bits_per_line=None):
+        """
+        @return a generator of Placement records, one per fragment of each
+        field, in order. Fields are placed as the generator advances, so
+        tools that need field positions can process huge specs without
+        rendering them or building their layout.
+        @param bits_per_line overrides the number of bits per line this object
+        is configured with.
+        """
+        if bits_per_line is None:
+            bits_per_line=self.bits_per_line
+        return iter_placements(self.field_list, bits_per_line)
+
+
+    def get_index(self):
+        """
+        @return the FieldIndex of this protocol's fields. It is built on the
+        first call and reused until the spec changes.
+        """
+        if self._index is None:
+            self._index=FieldIndex(self.field_list)
+        return self._index
+
+
+    def field_at(self, bit):
+        """
+        @return the FieldPosition of the field that contains the supplied bit,
+        counting from the start of the header.
+        @raise IndexError if the bit is outside the header.
+        """
+        return self.get_index().field_at(bit)
+
+
+    def fields_in_range(self, start, end):
+        """
+        @return a list with the FieldPosition of every field that overlaps
+        the bits in [start, end).
+        @raise IndexError if the range is outside the header.
+        """
+        return self.get_index().fields_in_range(start, end)
+
+
+    def offset_of(self, name):
+        """
+        @return the bit offset of the first field with the supplied name.
+        @raise KeyError if no field has that name.
+        """
+        return self.get_index().offset_of(name)
+
+
     def _process_field_list(self):
         """
         Processes the list of protocol fields that we got from the spec and turns
         it into something that we can print easily (useful for cases when we have
-        protocol fields that span more than one line). This is just a helper
-        function to make __str__()'s life easier.
-        """
-        new_fields=[]
-        bits_in_line=0
-        i=0
-        while i < len(self.field_list):
-            # Extract all the info we need about the field
-            field=self.field_list[i]
-            field_text= field['text']
-            field_len=  field['len']
-            field['MF']=False
-
-            available_in_line = self.bits_per_line - bits_in_line
-
-            # If we have enough space on this line to include the current field
-            # then just keep it as it is.
-            if available_in_line >= field_len:
-                new_fields.append(field)
-                bits_in_line+=field_len
-                i+=1
-                if bits_in_line==self.bits_per_line:
-                    bits_in_line=0
-            # Otherwise, split the field into two parts, one blank and one with
-            # the actual field text
+        protocol fields that span more than one line). The field list itself is
+        left untouched.
+        @return a list of dictionaries containing keys 'text', 'len' and 'MF'.
+        """
+        return [{'text':f.text, 'len':f.len, 'MF':f.MF} for f in self.compile().fragments]
+
+
+    def iter_lines(self, options=None):
+        """
+        Converts the protocol specification stored in the object to a nice
+        ASCII diagram like the ones that appear in RFCs, one line at a time.
+        Conversion supports fields of any length, and supports field that span
+        more than one line in the diagram.
+        @param options is an optional set of options for this render only,
+        as in render().
+        @return a generator of strings, one per line of the ASCII
+        representation of the protocol header. Lines are not \n terminated.
+        """
+        return self._iter_lines(self._get_options(options))
+
+
+    def _iter_lines(self, options, check=True):
+        """
+        @return a generator of the lines of the ASCII diagram for the supplied
+        RenderOptions. Unless check is False, the size of the diagram is
+        checked against the limits of this object before anything is laid
+        out or rendered.
+        @raise ProtocolLimitException if the diagram exceeds the limits.
+        """
+        if check:
+            self.limits.check(self.field_list, options)
+        # Get the compiled layout. This does some magic to make the algorithm
+        # work for fields that span more than one line
+        layout=self.compile(options.bits_per_line, options.elide_rows is not None)
+        return self.limits.iter_lines(iter_lines(layout, options))
+
+
+    def render(self, options=None):
+        """
+        Renders the ASCII diagram of this protocol. Unlike str(), options may
+        be supplied for this render only: the object is not modified, so any
+        number of threads can render the same object, each with its own
+        options.
+        @param options is an optional RenderOptions instance or mapping of
+        option names to values that take precedence over the options of this
+        object. Entries whose value is None are ignored.
+        @return a string containing the ASCII representation of the header.
+        @raise ProtocolException if the options are unknown or not valid.
+        @raise ProtocolLimitException if the diagram exceeds the limits.
+        """
+        return self._render(self._get_options(options))
+
+
+    def _render(self, options, check=True):
+        """
+        @return the ASCII diagram of this protocol for the supplied
+        RenderOptions, without touching the options stored in the object.
+        """
+        return "\n".join(self._iter_lines(options, check))
+
+
+    def render_rows(self, start, end):
+        """
+        Renders a window of the diagram: diagram rows [start, end), where
+        row r holds bits r*bits_per_line to (r+1)*bits_per_line-1. Only the
+        fields that overlap the window, found through the offset index, are
+        laid out, so the cost depends on the size of the window and not on
+        the size of the header.
+        @return a string with the border above the first row and the text
+        line and the border below every row in the window, exactly as they
+        appear in str(self). The bit numbers on top are not included. Rows
+        that take several lines are cut at the window edges, unless blank
+        lines are elided, in which case they are printed whole.
+        @raise IndexError if the window is outside the diagram.
+        @raise ProtocolLimitException if the window has more lines than the
+        limits of this object allow, or takes too long to render.
+        """
+        options=self.get_options()
+        bits_per_line=options.bits_per_line
+        index=self.get_index()
+        rows=-(-len(index)//bits_per_line)
+        if not 0 <= start <= end <= rows:
+            raise IndexError("rows %i-%i are outside the diagram (%i rows)" % (start, end, rows))
+        if start==end:
+            return ""
+        if self.limits.max_rows is not None and 2*(end-start)+1>self.limits.max_rows:
+            raise ProtocolLimitException("FATAL: Window too long (%i lines, the limit is %i)"
+                                         % (2*(end-start)+1, self.limits.max_rows))
+
+        first_row, fields=self._window_fields(start, end, bits_per_line)
+        layout=compile_layout(fields, bits_per_line)
+        return "\n".join(self.limits.iter_lines(iter_window_lines(layout, first_row, start, end, options)))
+
+
+    def _window_fields(self, start, end, bits_per_line):
+        """
+        Selects the fields to lay out to render diagram rows [start, end):
+        every field from the one above the window (it decides the border
+        above the first row) to the one that ends it. Fields that are split
+        in many rows are cut to the rows around the window, so the cost of
+        the layout does not depend on their length.
+        @return a (first_row, fields) tuple with the diagram row the layout
+        of the returned FieldList starts at.
+        """
+        index=self.get_index()
+        first=index.field_at(max(start*bits_per_line-1, 0)).index
+        last=index.field_at(min(end*bits_per_line, len(index))-1).index
+        names=list(self.field_list.names[first:last+1])
+        lengths=list(self.field_list.lengths[first:last+1])
+        offset=index.offsets[first]
+
+        # The part of a field that follows its first line is split in full
+        # lines plus a shorter tail, unless it is a multiple of the line
+        # length. Only in the first case can we drop lines from the field.
+        # Its text goes on its last full line.
+        def split_in_lines(offset, length):
+            rest=length-(-offset%bits_per_line)
+            return rest>bits_per_line and rest%bits_per_line!=0
+
+        # Start the first field at the row above the window
+        cut=(start-1)*bits_per_line
+        if split_in_lines(offset, lengths[0]) and cut>offset+(-offset%bits_per_line):
+            end_bit=offset+lengths[0]
+            if end_bit-(end_bit-offset-(-offset%bits_per_line))%bits_per_line-bits_per_line<cut:
+                names[0]=""
+            lengths[0]=end_bit-cut
+            offset=cut
+
+        # Finish the last field one full line below the window
+        last_offset=offset+sum(lengths[:-1])
+        if split_in_lines(last_offset, lengths[-1]) and last_offset+lengths[-1]>(end+2)*bits_per_line:
+            first_line=-last_offset%bits_per_line
+            lines=end+1-(last_offset+first_line)//bits_per_line
+            lengths[-1]=first_line+lines*bits_per_line+1
+
+        # Blank bits before the first field keep it in its original column
+        if offset%bits_per_line:
+            names.insert(0, "")
+            lengths.insert(0, offset%bits_per_line)
+        return offset//bits_per_line, FieldList(names, lengths)
+
+
+    def render_range(self, start_bit, end_bit):
+        """
+        Renders the diagram rows that hold bits [start_bit, end_bit). See
+        render_rows() for details.
+        @raise IndexError if the bits are outside the header.
+        """
+        total=len(self.get_index())
+        if not 0 <= start_bit < end_bit <= total:
+            raise IndexError("bits %i-%i are outside the header (%i bits)" % (start_bit, end_bit, total))
+        bits_per_line=self.bits_per_line
+        return self.render_rows(start_bit//bits_per_line, -(-end_bit//bits_per_line))
+
+
+    def render_variants(self, variants):
+        """
+        Renders this protocol with several sets of options, sharing as much
+        work as possible: the spec is parsed once, each line length is laid
+        out once and variants that only differ in their border characters
+        are obtained by translating a single canonical render, made with the
+        placeholders in CANONICAL_CHARS. The object itself is not modified.
+        @param variants is an iterable of RenderOptions instances or mappings
+        of option names to values. Options missing from a mapping, or set to
+        None, keep the value this object is configured with.
+        @return a list with one diagram per variant, in the same order.
+        @raise ProtocolException if some options are unknown or not valid.
+        @raise ProtocolLimitException if some variant exceeds the limits.
+        """
+        base=self.get_options()
+        names="".join(self.field_list.names)
+        translatable=not any(placeholder in names for placeholder in CANONICAL_CHARS.values())
+        canonical={}
+        results=[]
+        for variant in variants:
+            options=base.updated(variant)
+            self.limits.check(self.field_list, options)
+            if not translatable:
+                results.append(self._render(options, False))
+                continue
+            key=options.canonical()
+            diagram=canonical.get(key)
+            if diagram is None:
+                diagram=canonical[key]=self._render(key, False)
+            results.append(diagram.translate(options.translation()))
+        return results
+
+
+    def render_formats(self, formats, options=None):
+        """
+        Renders this protocol in several output formats, all of them from
+        the same compiled layout.
+        @param formats is an iterable of format names or a comma-separated
+        string of them (see protocol_graph.formats).
+        @param options is an optional set of options for this render only,
+        as in render().
+        @return a list with the protocol in each format, in the same order.
+        @raise ProtocolException if some format is unknown.
+        @raise ProtocolLimitException if the diagram exceeds the limits.
+        """
+        formats=parse_formats(formats)
+        options=self._get_options(options)
+        self.limits.check(self.field_list, options)
+        layout=self.compile(options.bits_per_line, options.elide_rows is not None)
+        results=[]
+        for name in formats:
+            renderer=get_renderer(name)
+            # The ASCII diagram goes through the time limit, line by line
+            if type(renderer) is AsciiRenderer:
+                results.append(self._render(options, False))
             else:
+                result=renderer.render(layout, options)
+                self.limits.check_diagram(result)
+                results.append(result)
+        return results
+
+
+    def get_template(self):
+        """
+        @return the RenderTemplate for the field lengths and the current
+        options of this protocol. Templates are shared by every protocol
+        with the same field lengths and options, so specs that only differ
+        in their field names are laid out and rendered once.
+        @raise ProtocolLimitException if the diagram exceeds the limits.
+        """
+        options=self.get_options()
+        self.limits.check(self.field_list, options)
+        return get_template(self.field_list.lengths, options, self.limits)
+
+
+    def render_labels(self, names):
+        """
+        Renders this protocol with different field names, keeping its field
+        lengths and options. Only the names are formatted, on top of the
+        template returned by get_template(). The object is not modified.
+        @param names is a sequence with one name per field.
+        @return a string containing the ASCII representation of the header.
+        @raise ProtocolException if the number of names is not the number
+        of fields.
+        @raise ProtocolLimitException if the diagram exceeds the limits.
+        """
+        options=self.get_options()
+        if len(names)==len(self.field_list):
+            self.limits.check(FieldList(names, self.field_list.lengths), options)
+        return get_template(self.field_list.lengths, options, self.limits).fill(names)
+
 
-                # Case 1: We have a field that is perfectly aligned and it
-                # has a length that is multiple of our line length
-                if bits_in_line==0 and field_len%self.bits_per_line==0:
-                    new_fields.append(field)
-                    i+=1
-                    bits_in_line=0
-
-                # Case 2: We weren't that lucky and the field is either not
-                # aligned or we can't print it using an exact number of full
-                # lines
-                else:
-
-                    # If we have more space in the current line than in the next,
-                    # then put the field text in this one
-                    if available_in_line >= field_len-available_in_line:
-                        new_field = {'text':field_text, 'len':available_in_line, "MF":True}
-                        new_fields.append(new_field)
-                        field['text']=""
-                        field['len']=field_len-available_in_line
-                        field['MF']=False
-                    else:
-                        new_field = {'text':"", 'len':available_in_line, "MF":True}
-                        new_fields.append(new_field)
-                        field['text']=field_text
-                        field['len']=field_len-available_in_line
-                        field['MF']=False
-                    bits_in_line=0
-                    continue
-        return new_fields
+    def write_to(self, fileobj):
+        """
+        Writes the ASCII diagram to the supplied file object as it is generated,
+        so the diagram is never built as a single string. The output matches
+        print(self, file=fileobj): lines are separated by newlines and the
+        last one is newline terminated too.
+        @param fileobj is any object with a write() method that accepts str.
+        """
+        for line in self.iter_lines():
+            fileobj.write(line)
+            fileobj.write("\n")
+
+
+    def measure(self, encoding="utf-8"):
+        """
+        Computes the size of the ASCII diagram from the field lengths, in
+        O(fields) time, without laying out or rendering it. Only if some
+        border character takes more than one byte in the encoding are the
+        lines rendered and encoded, within the limits of this object.
+        @param encoding is the encoding the size in bytes refers to.
+        @return a Measurement instance with the number of lines of str(self),
+        the length of the longest one and the size of the encoded diagram.
+        @raise ProtocolLimitException if the diagram has to be rendered and
+        it exceeds the limits.
+        """
+        options=self.get_options()
+        return measure_fields(self.field_list, options, encoding, lambda: self._iter_lines(options))
+
+
+    def render_into(self, buffer, offset=0, encoding="utf-8"):
+        """
+        Writes the encoded ASCII diagram straight into a preallocated buffer,
+        one line at a time, so the diagram is never built as a single string
+        nor copied around. The bytes written match str(self).encode(encoding).
+        @param buffer is a writable bytes-like object, like a bytearray or a
+        memoryview.
+        @param offset is the position of the buffer to start writing at.
+        @return the offset just past the last byte written, so several
+        diagrams can be written one after another.
+        @raise ProtocolException if the diagram does not fit in the buffer.
+        """
+        options=self.get_options()
+        lines=self._iter_lines(options)
+        view=memoryview(buffer).cast("B")
+        size=measure_fields(self.field_list, options, encoding, lambda: self._iter_lines(options)).bytes
+        if offset<0 or offset+size>len(view):
+            raise ProtocolException("FATAL: Buffer too small for the diagram (%i bytes needed at offset %i, %i available)"
+                                    % (size, offset, len(view)-offset))
+        for data in iter_encoded(lines, encoding):
+            view[offset:offset+len(data)]=data
+            offset+=len(data)
+        return offset
 
 
     # Convert to string
     def __str__(self):
         """
         Converts the protocol specification stored in the object to a nice
-        ASCII diagram like the ones that appear in RFCs. Conversion supports
-        fields of any length, and supports field that span more than one
-        line in the diagram.
+        ASCII diagram like the ones that appear in RFCs.
         @return a string containing the ASCII representation of the protocol
         header.
         """
+        return self._render(self._options)
 
-        # First of all, process our field list. This does some magic to make
-        # the algorithm work for fields that span more than one line
-        proto_fields = self._process_field_list()
-        lines=[]
-        numbers=self._get_top_numbers()
-        if numbers is not None:
-            lines.append(numbers)
-        lines.append(self._get_horizontal())
-
-        # Print all protocol fields
-        bits_in_line=0
-        current_line=""
-        fields_done=0
-        p=-1
-        while p < len(proto_fields)-1:
-            p+=1
-
-            # Extract all the info we need about the field
-            field = proto_fields[p]
-            field_text= field['text']
-            field_len=  field['len']
-            field_mf =  field['MF'] is True  # Field has more fragments
-            # If the field text is too long, we truncate it, and add a dot
-            # at the end.
-            if len(field_text) > (field_len*2*self.ph_num_per_bit)-1:
-                field_text=field_text[0:(field_len*2*self.ph_num_per_bit)-1]
-                if len(field_text)>self.ph_num_per_bit:
-                    field_text=field_text[0:-1]+"."
-
-            # If we have space for the whole field in the current line, go
-            # ahead and add it
-            if self.bits_per_line-bits_in_line >= field_len:
-                # If this is the first thing we print on a line, add the
-                # starting character
-                if bits_in_line==0:
-                    current_line+=self._get_separator()
-                # Add the whole field
-                if self.do_left_to_right_print:
-                    current_line+=str.center(field_text, (field_len*2*self.ph_num_per_bit)-1)
-                else:
-                    current_line=str.center(field_text, (field_len*2*self.ph_num_per_bit)-1)+current_line
-
-                # Update counters
-                bits_in_line+=field_len
-                fields_done+=1
-
-                # If this is the last character in the line, store the line
-                if bits_in_line==self.bits_per_line:
-                    if self.do_left_to_right_print:
-                        current_line+=self._get_separator()
-                    else:
-                        current_line=self._get_separator()+current_line
-                    lines.append(current_line)
-                    current_line=""
-                    bits_in_line=0
-                    # When we have a fragmented field, we may need to suppress
-                    # the floor of the field, so the current line connects
-                    # with the one that follows. E.g.:
-                    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
-                    # |            field16            |                               |
-                    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+                               +
-                    # |                             field                             |
-                    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
-                    if field_mf is True:
-                        if proto_fields[p+1]['len'] > self.bits_per_line - field_len:
-
-                            # Print some +-+-+ to cover the previous field
-                            if self.do_left_to_right_print:
-                                line_left=self._get_horizontal(self.bits_per_line - field_len)
-                            else:
-                                line_left=self._get_horizontal(self.bits_per_line - field_len)[field_len*2*self.ph_num_per_bit:]
-                            if len(line_left)==0:
-                                line_left=self.hdr_char_start
-
-                            # Now print some empty space to cover the part that
-                            # we can join with the field below.
-                            # Case 1: If the next field reaches the end of its
-                            # line, then we need to print whitespace until the
-                            # end our line
-                            if proto_fields[p+1]['len'] >= self.bits_per_line:
-                                line_center=" "*  ((2*(field_len)*self.ph_num_per_bit-1))
-                                line_right=self.hdr_char_end
-                            # Case 2: the field in the next row is not big enough
-                            # to cover all the space we'd like to join, so we
-                            # just print whitespace to cover as much as we can
-                            else:
-                                line_center=" "* ((2*((proto_fields[p+1]['len']-(self.bits_per_line-field_len)))*self.ph_num_per_bit)-1)
-                                if self.do_left_to_right_print:
-                                    line_right=self._get_horizontal(self.bits_per_line-proto_fields[p+1]['len'])
-                                else:
-                                    line_right=self._get_horizontal(self.bits_per_line-proto_fields[p+1]['len'])[( proto_fields[p+1]['len'])*2*self.ph_num_per_bit:]
-                            if self.do_left_to_right_print==True:
-                                lines.append(line_left+line_center+line_right)
-                            else:
-                                lines.append(line_right+line_center+line_left)
-                        else:
-                            lines.append(self._get_horizontal())
-                    else:
-                        lines.append(self._get_horizontal())
-
-
-                # If this is not the last character of the line but we have no
-                # more fields to print, wrap up
-                elif fields_done==len(proto_fields):
-                    if self.do_left_to_right_print:
-                        current_line+=self._get_separator()
-                        lines.append(current_line)
-                    else:
-                        current_line=self._get_separator()+current_line
-                        lines.append(" "*((self.bits_per_line-bits_in_line)*2*self.ph_num_per_bit)+current_line)
-                    lines.append(self._get_horizontal(bits_in_line))
-                else:
-                    # Add the separator character
-                    if self.do_left_to_right_print:
-                        current_line+=self.hdr_char_sep
-                    else:
-                        current_line=self.hdr_char_sep+current_line
-
-            # We don't have enough space for the field on this line.
-            else:
-                # Case 1: We are at the beginning of a new line and we need to
-                # span more than one line
-                if bits_in_line==0:
-                    # Case 1a: We have a multiple of the number of bits per line
-                    if field_len%self.bits_per_line==0:
-                        # Compute how many lines in total we need to print for this
-                        # big field.
-                        lines_to_print = int(((field_len/self.bits_per_line)*2)-1)
-                        # We print the field text in the central line
-                        central_line=int(lines_to_print/2)
-                        # Print all those lines
-                        for i in range(0, lines_to_print):
-
-                            # Let's figure out which character we need to use
-                            # to start and end the current line
-                            if i%2==1:
-                                start_line=self.hdr_char_start
-                                end_line=self.hdr_char_end
-                            else:
-                                start_line=self.hdr_char_sep
-                                end_line=self.hdr_char_sep
-
-                            # This is the line where we need to print the field
-                            # text.
-                            if i == central_line:
-                                lines.append(start_line + str.center(field_text, (self.bits_per_line*2*self.ph_num_per_bit)-1) + end_line)
-                            # This is a line we need to leave blank
-                            else:
-                                lines.append(start_line + (" " * ((self.bits_per_line*2*self.ph_num_per_bit)-1)) +  end_line)
-                            # If we just added the last line, add a horizontal separator
-                            if i==lines_to_print-1:
-                                lines.append(self._get_horizontal())
-                                fields_done+=1
-                        
-
-                # Case 2: We are not at the beginning of the line and we need
-                # to print something that does not fit in the current line
-                else:
-                    # This should never happen, since our _process_field_list()
-                    # divides fields in chunks so we never have the case of
-                    # something spanning lines in a weird manner
-                    assert(False)
-
-        result= "\n".join(lines)
-        return result
+
+def _option_property(name):
+    """
+    @return a property that reads and writes one of the render options of a
+    Protocol. Writing it replaces the RenderOptions instance of the object,
+    so renders that already started keep the options they were started with.
+    """
+    def get(self):
+        return getattr(self._options, name)
+    def set(self, value):
+        self._options=self._options._replace(**{name: value})
+    return property(get, set)
+
+
+# Render options can still be read and set as attributes of the object
+for _name in RenderOptions._fields:
+    setattr(Protocol, _name, _option_property(_name))
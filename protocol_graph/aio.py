@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the asyncio rendering API. Small specs are rendered on   #
+#  the event loop, since handing them to a thread would cost more than         #
+#  rendering them. Large ones are rendered on an executor, a few at a time,    #
+#  and stop as soon as the task that waits for them is cancelled.              #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import asyncio
+import threading
+import weakref
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.cache import render_cache, _cache_key
+from protocol_graph.cache import render as render_sync
+from protocol_graph import specs
+
+
+# Default semaphores that bound the renders on executors, per event loop
+_semaphores=weakref.WeakKeyDictionary()
+
+
+def _get_semaphore():
+    """
+    @return the default semaphore of the running event loop, which lets
+    AIO_CONCURRENCY renders run on executors at once.
+    """
+    loop=asyncio.get_running_loop()
+    semaphore=_semaphores.get(loop)
+    if semaphore is None:
+        semaphore=_semaphores[loop]=asyncio.Semaphore(AIO_CONCURRENCY)
+    return semaphore
+
+
+def is_small(fields):
+    """
+    @return True if a field list is small enough to be rendered on the event
+    loop: it has at most AIO_INLINE_FIELDS fields and AIO_INLINE_BITS bits.
+    Specs that are not valid count as small, since they fail straight away.
+    @param fields is the field list part of a textual spec.
+    """
+    if fields.count(",")>=AIO_INLINE_FIELDS:
+        return False
+    bits=0
+    for item in fields.split(","):
+        try:
+            bits+=int(item.rpartition(":")[2])
+        except ValueError:
+            return True
+    return bits<=AIO_INLINE_BITS
+
+
+def _render_lines(spec, options, limits, cancelled):
+    """
+    Renders a spec line by line, giving up as soon as the cancelled event is
+    set. This is the function that runs on the executor.
+    @return the rendered diagram, or None if the render was cancelled.
+    """
+    from protocol_graph import Protocol
+    lines=[]
+    for line in Protocol(spec, limits).iter_lines(options):
+        if cancelled.is_set():
+            return None
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def render(spec, options=None, limits=None, executor=None, semaphore=None):
+    """
+    Renders a protocol spec as an ASCII diagram without blocking the event
+    loop for long. Small specs (see is_small()) are rendered straight away,
+    through the render cache. Large ones are parsed and rendered on an
+    executor; if the calling task is cancelled, the render stops at the next
+    line of the diagram.
+    @param spec is either a textual protocol spec or the name of one of the
+    protocols in specs.protocols.
+    @param options is an optional mapping of render options that take
+    precedence over the ones in the spec (see cache.render()).
+    @param limits is an optional RenderLimits instance.
+    @param executor is the concurrent.futures executor large specs are
+    rendered on. Defaults to the default executor of the event loop.
+    @param semaphore is the asyncio.Semaphore that bounds the number of
+    renders running on executors. Defaults to one per event loop, that
+    allows AIO_CONCURRENCY renders at once.
+    @return a string containing the ASCII representation of the header.
+    @raise ProtocolException in case the supplied spec is not valid
+    @raise ProtocolLimitException if the spec exceeds the limits.
+    """
+    spec=specs.protocols.get(spec, spec)
+    key=_cache_key(spec, options)
+    if is_small(key[0]):
+        return render_sync(spec, options, limits=limits)
+
+    result=render_cache.get(key)
+    if result is not None:
+        if limits is not None:
+            limits.check_fields(key[0].count(",")+1)
+            limits.check_diagram(result)
+        return result
+
+    if semaphore is None:
+        semaphore=_get_semaphore()
+    cancelled=threading.Event()
+    async with semaphore:
+        future=asyncio.get_running_loop().run_in_executor(executor, _render_lines, spec, key[1], limits, cancelled)
+        try:
+            result=await future
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    render_cache.put(key, result)
+    return result
+
+
+async def render_many(specs, options=None, limits=None, executor=None, concurrency=None):
+    """
+    Renders a list of protocol specs concurrently. See render() for a
+    description of the parameters.
+    @param concurrency is the number of renders that may run on executors at
+    once. Defaults to the limit shared by every render on the event loop.
+    @return a list with one entry per spec, in input order. Each entry is
+    either the rendered diagram or the ProtocolException raised by the spec.
+    @raise ProtocolException if concurrency is not a positive integer.
+    """
+    semaphore=None
+    if concurrency is not None:
+        if not isinstance(concurrency, int) or concurrency<=0:
+            raise ProtocolException("FATAL: Invalid concurrency (%s)" % concurrency)
+        semaphore=asyncio.Semaphore(concurrency)
+
+    async def render_one(spec):
+        try:
+            return await render(spec, options, limits, executor, semaphore)
+        except ProtocolException as e:
+            return e
+
+    return list(await asyncio.gather(*[render_one(spec) for spec in specs]))
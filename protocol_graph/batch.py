@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the batch rendering API. It renders long lists of        #
+#  protocol specs on a pool of worker processes and hands the results back in  #
+#  the same order the specs were supplied.                                     #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.cache import render, render_formats
+from protocol_graph.formats import parse_formats
+
+
+def _render_one(spec, options, limits, formats=None):
+    """
+    @return the rendered diagram for the supplied spec, the list of outputs
+    if formats is not None, or the ProtocolException raised while processing
+    it.
+    """
+    try:
+        if formats is not None:
+            return render_formats(spec, formats, options, limits=limits)
+        return render(spec, options, limits=limits)
+    except ProtocolException as e:
+        return e
+
+
+def _render_chunk(chunk, options, limits, formats=None):
+    """
+    Renders a list of specs. This is the function that runs on the worker
+    processes. Since each worker keeps its own render cache, workers get
+    faster as they see more specs.
+    @return a list with one entry per spec: either the rendered diagram or
+    the ProtocolException raised while processing it.
+    """
+    return [_render_one(spec, options, limits, formats) for spec in chunk]
+
+
+def iter_render_many(specs, options=None, jobs=1, chunksize=BATCH_CHUNK_SIZE, limits=None, formats=None):
+    """
+    Renders a sequence of protocol specs, yielding the results in the same
+    order as the specs. Specs are consumed lazily: in-process, each spec is
+    rendered as soon as it is read, and with several jobs only a few chunks
+    per worker are in flight at any given time.
+    @param specs is an iterable of textual protocol specs or protocol names.
+    @param options is an optional mapping of render options that take
+    precedence over the ones in each spec (see render()).
+    @param jobs is the number of worker processes to use. With one job (the
+    default), specs are rendered in the calling process.
+    @param chunksize is the number of specs handed to a worker at once.
+    @param limits is an optional RenderLimits instance applied to each spec.
+    Specs that exceed it produce a ProtocolLimitException.
+    @param formats is an optional list of output formats (see render_formats()).
+    If supplied, each spec produces a list with one output per format instead
+    of a diagram.
+    @return a generator of rendered diagrams. Specs that are not valid produce
+    the corresponding ProtocolException instead of a diagram.
+    @raise ProtocolException if jobs or chunksize are not positive integers,
+    or if some format is unknown.
+    """
+    if not isinstance(jobs, int) or jobs<=0:
+        raise ProtocolException("FATAL: Invalid number of jobs (%s)" % jobs)
+    if not isinstance(chunksize, int) or chunksize<=0:
+        raise ProtocolException("FATAL: Invalid chunk size (%s)" % chunksize)
+    if formats is not None:
+        formats=parse_formats(formats)
+
+    # In-process rendering yields each result as soon as its spec is read
+    if jobs==1:
+        for spec in specs:
+            yield _render_one(spec, options, limits, formats)
+        return
+
+    # The same workers process every chunk, so their caches stay warm. We
+    # keep two chunks per worker queued so no worker sits idle while we
+    # hand results back to the caller.
+    specs=iter(specs)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending=deque()
+        while True:
+            chunk=list(islice(specs, chunksize))
+            if len(chunk)>0:
+                pending.append(pool.submit(_render_chunk, chunk, options, limits, formats))
+            if len(pending)==0:
+                return
+            if len(chunk)==0 or len(pending)>=2*jobs:
+                yield from pending.popleft().result()
+
+
+def render_many(specs, options=None, jobs=1, chunksize=BATCH_CHUNK_SIZE, limits=None, formats=None):
+    """
+    Renders a list of protocol specs, optionally on a pool of worker processes.
+    See iter_render_many() for a description of the parameters.
+    @return a list with one entry per spec, in input order. Each entry is
+    either the rendered diagram or the ProtocolException raised by the spec.
+    """
+    return list(iter_render_many(specs, options, jobs, chunksize, limits, formats))
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the process-wide render cache. It maps a protocol spec   #
+#  and the effective options used to render it to the resulting ASCII diagram, #
+#  so headers that are printed over and over are only built once.              #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.options import DEFAULT_OPTIONS, parse_options
+from protocol_graph.formats import parse_formats
+from protocol_graph import specs
+
+
+class CacheStats(namedtuple("CacheStats", ["hits", "misses", "evictions", "size", "maxsize"])):
+    """
+    This class represents a snapshot of the statistics of a RenderCache.
+    """
+    __slots__ = ()
+
+
+class RenderCache():
+    """
+    This class implements a bounded cache with least-recently-used eviction.
+    It is bounded both by number of entries and by the memory its values take.
+    It is safe to use from several threads at the same time.
+    """
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE, maxbytes=RENDER_CACHE_BYTES):
+        """
+        Class constructor.
+        @param maxsize is the maximum number of entries kept in the cache. A
+        value of zero disables caching altogether.
+        @param maxbytes is the maximum number of bytes the cached values may
+        take, as reported by sys.getsizeof(). Values larger than that are not
+        cached.
+        @raise ProtocolException if maxbytes is not a non-negative integer.
+        """
+        if not isinstance(maxbytes, int) or maxbytes<0:
+            raise ProtocolException("FATAL: Invalid render cache size (%s bytes)" % maxbytes)
+        self.maxsize=0                  # Maximum number of entries
+        self.maxbytes=maxbytes          # Maximum number of bytes of the values
+        self.hits=0                     # Lookups that found an entry
+        self.misses=0                   # Lookups that did not find an entry
+        self.evictions=0                # Entries dropped to honour the bounds
+        self._entries=OrderedDict()     # Cached entries, oldest first
+        self._bytes=0                   # Bytes taken by the cached values
+        self._lock=threading.Lock()
+        self.resize(maxsize)
+
+
+    def get(self, key):
+        """
+        @return the value stored for key, or None if there is no such entry.
+        Successful lookups mark the entry as the most recently used one.
+        """
+        with self._lock:
+            value=self._entries.get(key)
+            if value is None:
+                self.misses+=1
+            else:
+                self.hits+=1
+                self._entries.move_to_end(key)
+            return value
+
+
+    def put(self, key, value):
+        """
+        Stores a value in the cache, evicting the least recently used entries
+        if the cache grows beyond its maximum size or number of bytes.
+        """
+        size=sys.getsizeof(value)
+        with self._lock:
+            if self.maxsize<=0 or size>self.maxbytes:
+                return
+            old=self._entries.pop(key, None)
+            if old is not None:
+                self._bytes-=sys.getsizeof(old)
+            self._entries[key]=value
+            self._bytes+=size
+            self._evict()
+
+
+    def resize(self, maxsize):
+        """
+        Changes the maximum number of entries of the cache. Entries that no
+        longer fit are evicted straight away.
+        @raise ProtocolException if maxsize is not a non-negative integer.
+        """
+        if not isinstance(maxsize, int) or maxsize<0:
+            raise ProtocolException("FATAL: Invalid render cache size (%s)" % maxsize)
+        with self._lock:
+            self.maxsize=maxsize
+            self._evict()
+
+
+    def clear(self):
+        """
+        Drops every entry and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes=0
+            self.hits=0
+            self.misses=0
+            self.evictions=0
+
+
+    def stats(self):
+        """
+        @return a CacheStats instance describing the current state of the cache.
+        """
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self.maxsize)
+
+
+    def _evict(self):
+        """
+        Drops least recently used entries until the cache fits its bound. Must
+        be called with the lock held.
+        """
+        while len(self._entries)>self.maxsize or self._bytes>self.maxbytes:
+            self._bytes-=sys.getsizeof(self._entries.popitem(last=False)[1])
+            self.evictions+=1
+
+
+# The process-wide cache used by render()
+render_cache=RenderCache()
+
+
+def _cache_key(spec, options):
+    """
+    @return the cache key for a spec rendered with the supplied option
+    overrides: the field list of the spec, followed by the RenderOptions
+    that are in effect once the spec options and the overrides are applied.
+    @raise ProtocolException if the options are not valid.
+    """
+    fields, sep, opts = spec.partition("?")
+    effective=DEFAULT_OPTIONS
+    if sep and "?" not in opts:
+        effective=effective.updated(parse_options(opts))
+    return fields, effective.updated(options)
+
+
+def render(spec, options=None, cache=None, limits=None):
+    """
+    Renders a protocol spec as an ASCII diagram, reusing a previously rendered
+    diagram whenever the same spec is rendered with the same effective options.
+    @param spec is either a textual protocol spec or the name of one of the
+    protocols in specs.protocols.
+    @param options is an optional RenderOptions instance or mapping of render
+    options that take precedence over the ones in the spec. Entries whose
+    value is None are ignored.
+    @param cache is the RenderCache to use. Defaults to the process-wide one.
+    @param limits is an optional RenderLimits instance. Diagrams found in the
+    cache are checked against its field and size limits too.
+    @return a string containing the ASCII representation of the header.
+    @raise ProtocolException in case the supplied spec or options are not valid
+    @raise ProtocolLimitException if the spec exceeds the limits.
+    """
+    from protocol_graph import Protocol
+    if cache is None:
+        cache=render_cache
+    spec=specs.protocols.get(spec, spec)
+
+    key=_cache_key(spec, options)
+    result=cache.get(key)
+    if result is None:
+        result=Protocol(spec, limits).render(key[1])
+        cache.put(key, result)
+    elif limits is not None:
+        limits.check_fields(key[0].count(",")+1)
+        limits.check_diagram(result)
+    return result
+
+
+def render_formats(spec, formats, options=None, cache=None, limits=None):
+    """
+    Renders a protocol spec in several output formats. Outputs are cached per
+    format, and the formats that are not in the cache are rendered from a
+    single parse and layout of the spec. ASCII diagrams share their entries
+    with render().
+    @param formats is an iterable of format names or a comma-separated string
+    of them (see protocol_graph.formats).
+    See render() for a description of the rest of the parameters.
+    @return a list with the protocol in each format, in the same order.
+    @raise ProtocolException in case the spec or some format are not valid
+    @raise ProtocolLimitException if the spec exceeds the limits.
+    """
+    from protocol_graph import Protocol
+    if cache is None:
+        cache=render_cache
+    formats=parse_formats(formats)
+    spec=specs.protocols.get(spec, spec)
+
+    key=_cache_key(spec, options)
+    keys=[key if name=="ascii" else (key, name) for name in formats]
+    results=[cache.get(entry) for entry in keys]
+    missing=[name for name, result in zip(formats, results) if result is None]
+    if missing:
+        rendered=dict(zip(missing, Protocol(spec, limits).render_formats(missing, key[1])))
+    elif limits is not None:
+        limits.check_fields(key[0].count(",")+1)
+    for index, name in enumerate(formats):
+        if results[index] is None:
+            results[index]=rendered[name]
+            cache.put(keys[index], results[index])
+        elif limits is not None:
+            limits.check_diagram(results[index])
+    return results
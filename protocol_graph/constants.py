@@ -68,3 +68,61 @@ APPLICATION_AUTHOR_EMAIL="luis.mgarc@gmail.com"
 OP_SUCCESS =  0                # Function performed operation successfully
 OP_FAILURE = -1                # Error encountered while performing operation
 
+
+# Character used for the lines that replace elided runs of blank lines
+ELIDE_CHAR = "~"
+
+# Default number of diagrams kept by the process-wide render cache
+RENDER_CACHE_SIZE = 1024
+
+# Default number of bytes of diagrams kept by each render cache. Diagrams
+# larger than this are not cached at all.
+RENDER_CACHE_BYTES = 32*1024*1024
+
+# Number of specs handed to a worker process at once by render_many()
+BATCH_CHUNK_SIZE = 256
+
+# Number of distinct ruler and border tables kept in memory
+TABLES_CACHE_SIZE = 64
+
+# Minimum number of fields for the layout engine to use NumPy, if available
+NUMPY_MIN_FIELDS = 4096
+
+# Number of fields below which the layout engine uses a plain loop instead
+# of prefix sums
+LAYOUT_SMALL_FIELDS = 64
+
+# Number of rendered rows kept by each set of render tables
+ROWS_CACHE_SIZE = 4096
+
+# Number of characters of rendered rows kept by each set of render tables.
+# Rows longer than this are not kept at all.
+ROWS_CACHE_CHARS = 131072
+
+# Number of lines rendered between checks of the time limit
+LIMITS_CHECK_LINES = 64
+
+# Number of fields compared at once when looking for the common start of two
+# field lists
+COMMON_PREFIX_STEP = 4096
+
+# Number of render templates kept by the process-wide template cache
+TEMPLATE_CACHE_SIZE = 256
+
+# Size of the SVG diagrams: width of a bit and height of a line, in pixels,
+# and size of the font used for field names
+SVG_BIT_WIDTH = 16
+SVG_ROW_HEIGHT = 32
+SVG_FONT_SIZE = 12
+
+# Largest specs the asyncio API renders on the event loop, by number of fields
+# and total bits. Larger ones are rendered on an executor.
+AIO_INLINE_FIELDS = 256
+AIO_INLINE_BITS = 8192
+
+# Default number of renders the asyncio API runs on executors at once, per
+# event loop
+AIO_CONCURRENCY = 8
+
+# Number of characters read at once when parsing specs from a stream
+TOKENIZER_CHUNK_SIZE = 65536
@@ -61,7 +61,16 @@ class ProtocolException(Exception):
     This class represents exceptions raised by the Protocol class
     """
     def __init__(self, errmsg):
+        Exception.__init__(self, errmsg)    # Keeps instances picklable
         self.errmsg=errmsg
 
     def __str__(self):
         return str(self.errmsg)
+
+
+class ProtocolLimitException(ProtocolException):
+    """
+    This class represents exceptions raised when a protocol exceeds the
+    resource limits it is rendered with.
+    """
+    pass
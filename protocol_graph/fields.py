@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the compact storage used for the list of fields of a     #
+#  protocol: a tuple of interned field names and an array with their lengths.  #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+
+
+class Field(namedtuple("Field", ["text", "len"])):
+    """
+    This class represents a single protocol field: its text and its length in
+    bits.
+    """
+    __slots__ = ()
+
+
+class FieldPosition(namedtuple("FieldPosition", ["index", "text", "len", "offset"])):
+    """
+    This class represents a field located within the header: index is its
+    position in the field list, text and len describe the field and offset
+    is the bit it starts at, counting from the start of the header.
+    """
+    __slots__ = ()
+
+    @property
+    def end(self):
+        """
+        The first bit after the field.
+        """
+        return self.offset+self.len
+
+
+def _typecode(lengths):
+    """
+    @return the smallest unsigned array typecode able to store all the
+    supplied lengths.
+    @raise ProtocolException if some length does not fit in 64 bits.
+    """
+    longest=max(lengths, default=0)
+    for code in ("B", "H", "I", "Q"):
+        if longest < 1 << (8*array(code).itemsize):
+            return code
+    raise ProtocolException("FATAL: Fields may be at most %i bits long" % ((1 << 64)-1))
+
+
+class FieldList():
+    """
+    This class stores the list of fields of a protocol in a compact way: field
+    names are kept in a tuple of interned strings, so repeated names are only
+    stored once, and lengths in an array of the smallest integer type that
+    holds them. Instances are immutable and behave as a sequence of Field
+    records. They also pickle to a few bytes per field.
+    """
+    __slots__ = ("names", "lengths")
+
+    def __init__(self, names=(), lengths=()):
+        """
+        Class constructor.
+        @param names is an iterable with the text of each field.
+        @param lengths is an iterable with the length in bits of each field.
+        @raise ProtocolException if both iterables have different lengths.
+        """
+        names=tuple([sys.intern(name) for name in names])
+        if not isinstance(lengths, array):
+            lengths=list(lengths)
+            lengths=array(_typecode(lengths), lengths)
+        if len(names)!=len(lengths):
+            raise ProtocolException("FATAL: Field names and lengths don't match")
+        object.__setattr__(self, "names", names)
+        object.__setattr__(self, "lengths", lengths)
+
+
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Builds a FieldList from an iterable of (text, len) tuples, consuming
+        it one field at a time. Lengths are stored in the smallest array type
+        that fits them as they are read, so no intermediate list is built.
+        @raise ProtocolException if some length does not fit in 64 bits.
+        """
+        names=[]
+        lengths=array("B")
+        limit=1 << 8
+        intern=sys.intern
+        for text, bits in fields:
+            names.append(intern(text))
+            if bits>=limit:
+                lengths=array(_typecode([bits]), lengths)
+                limit=1 << (8*lengths.itemsize)
+            lengths.append(bits)
+        return cls(names, lengths)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FieldList instances are immutable")
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FieldList(self.names[index], self.lengths[index])
+        return Field(self.names[index], self.lengths[index])
+
+
+    def __iter__(self):
+        return map(Field, self.names, self.lengths)
+
+
+    def __add__(self, other):
+        return FieldList(self.names+tuple(other.names), list(self.lengths)+list(other.lengths))
+
+
+    def __eq__(self, other):
+        if not isinstance(other, FieldList):
+            return NotImplemented
+        return self.names==other.names and list(self.lengths)==list(other.lengths)
+
+
+    def __hash__(self):
+        return hash((self.names, tuple(self.lengths)))
+
+
+    def __repr__(self):
+        return "FieldList(%r, %r)" % (list(self.names), list(self.lengths))
+
+
+    def common_prefix(self, other):
+        """
+        @return the number of fields at the start of this list that are
+        equal to the ones of the other FieldList.
+        """
+        count=min(len(self), len(other))
+        # Compare slices first, so the search runs at C speed for long lists
+        start=0
+        step=COMMON_PREFIX_STEP
+        while start<count:
+            end=min(start+step, count)
+            if self.names[start:end]!=other.names[start:end] or \
+               self.lengths[start:end].tolist()!=other.lengths[start:end].tolist():
+                break
+            start=end
+        while start<count and self.names[start]==other.names[start] and self.lengths[start]==other.lengths[start]:
+            start+=1
+        return start
+
+
+    def __reduce__(self):
+        # Interned names are pickled once and then referenced from the pickle
+        # memo, and lengths travel as the raw bytes of the array.
+        return _unpickle_field_list, (self.names, self.lengths.typecode, self.lengths.tobytes())
+
+
+def _unpickle_field_list(names, typecode, data):
+    """
+    Rebuilds a FieldList from the state returned by FieldList.__reduce__().
+    """
+    lengths=array(typecode)
+    lengths.frombytes(data)
+    return FieldList(names, lengths)
+
+
+class FieldIndex():
+    """
+    This class maps bit offsets to the fields of a FieldList, and back. It
+    stores the cumulative offset of every field, so lookups take O(log n)
+    time with a binary search instead of a walk over the field list.
+    """
+    __slots__ = ("fields", "offsets", "_first")
+
+    def __init__(self, fields):
+        """
+        Class constructor.
+        @param fields is the FieldList to index.
+        """
+        self.fields=fields
+        self.offsets=list(accumulate(fields.lengths, initial=0))
+        self._first=None
+
+
+    def __len__(self):
+        """
+        @return the total length of the indexed fields, in bits.
+        """
+        return self.offsets[-1]
+
+
+    def _position(self, index):
+        return FieldPosition(index, self.fields.names[index], self.fields.lengths[index], self.offsets[index])
+
+
+    def field_at(self, bit):
+        """
+        @return the FieldPosition of the field that contains the supplied bit.
+        @raise IndexError if the bit is outside the header.
+        """
+        if not 0 <= bit < self.offsets[-1]:
+            raise IndexError("bit %i is outside the header (%i bits)" % (bit, self.offsets[-1]))
+        return self._position(bisect_right(self.offsets, bit)-1)
+
+
+    def fields_in_range(self, start, end):
+        """
+        @return a list with the FieldPosition of every field that overlaps
+        the bits in [start, end). The list is empty if end <= start.
+        @raise IndexError if the range starts or ends outside the header.
+        """
+        total=self.offsets[-1]
+        if not 0 <= start <= total or not 0 <= end <= total:
+            raise IndexError("bit range %i-%i is outside the header (%i bits)" % (start, end, total))
+        if end<=start:
+            return []
+        first=bisect_right(self.offsets, start)-1
+        last=bisect_left(self.offsets, end)
+        return [self._position(i) for i in range(first, last)]
+
+
+    def offset_of(self, name):
+        """
+        @return the bit offset of the first field with the supplied name.
+        @raise KeyError if no field has that name.
+        """
+        if self._first is None:
+            first={}
+            for index, text in enumerate(self.fields.names):
+                first.setdefault(text, index)
+            self._first=first
+        return self.offsets[self._first[name]]
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the output formats. Every format is produced by a        #
+#  Renderer from the same compiled Layout, so a spec is parsed and laid out    #
+#  once no matter how many formats it is written in.                           #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import json
+from html import escape
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.layout import FLAG_MF, FLAG_TEXT
+from protocol_graph.rows import field_text, iter_lines
+
+
+class Renderer():
+    """
+    This class is the base of every output format. Subclasses set the name
+    of the format and implement render(). Renderers are stateless, so a
+    single instance of each is registered and shared.
+    """
+    name=None           # Name of the format, as given to --format
+    description=None    # Short description, for the command line help
+
+    def render(self, layout, options):
+        """
+        @return a string with the protocol in this format.
+        @param layout is the compiled Layout of the protocol.
+        @param options is the RenderOptions instance to render with. Its
+        number of bits per line matches the one of the layout.
+        """
+        raise NotImplementedError()
+
+
+    def __repr__(self):
+        return "<%s: %s>" % (type(self).__name__, self.name)
+
+
+class AsciiRenderer(Renderer):
+    """
+    This class renders the ASCII diagram, as str(Protocol) does.
+    """
+    name="ascii"
+    description="ASCII diagram, as in RFCs"
+
+    def render(self, layout, options):
+        return "\n".join(iter_lines(layout, options))
+
+
+class MarkdownRenderer(Renderer):
+    """
+    This class renders a Markdown table with one row per field: the bits it
+    takes, its length and its name.
+    """
+    name="markdown"
+    description="Markdown table with one row per field"
+
+    def render(self, layout, options):
+        lines=["| Bits | Length | Field |", "|-----:|-------:|:------|"]
+        for name, offset, length in iter_fields(layout):
+            bits=str(offset) if length==1 else "%d-%d" % (offset, offset+length-1)
+            name=name.replace("\\", "\\\\").replace("|", "\\|")
+            lines.append("| %s | %d | %s |" % (bits, length, name))
+        return "\n".join(lines)
+
+
+class SvgRenderer(Renderer):
+    """
+    This class renders an SVG image of the diagram, suitable for web pages.
+    Each fragment is drawn as a box, with the name of the field in the box
+    that shows it in the ASCII diagram. Rows that take several lines are as
+    tall as the lines they take, unless blank lines are elided.
+    """
+    name="svg"
+    description="SVG image of the diagram"
+
+    def render(self, layout, options):
+        bits_per_line=layout.bits_per_line
+        ph=options.ph_num_per_bit
+        bit_width=SVG_BIT_WIDTH*ph
+        width=bits_per_line*bit_width
+        numbers=options.do_print_top_tens is True or options.do_print_top_units is True
+        top=SVG_ROW_HEIGHT if numbers else 0
+        elements=[]
+
+        # Bit numbers
+        if numbers:
+            for bit in range(0, bits_per_line):
+                x=(bit if options.do_left_to_right_print else bits_per_line-bit-1)*bit_width+bit_width//2
+                elements.append('<text x="%d" y="%d" class="number">%d</text>' % (x, top//2, bit))
+
+        # Fields
+        y=top
+        texts=layout.texts()
+        for row in layout.rows:
+            height=row.height
+            if options.elide_rows is not None and height-1>options.elide_rows:
+                height=2
+            for index in range(row.start, row.end):
+                bits=min(layout.lengths[index], bits_per_line)
+                column=layout.offsets[index]%bits_per_line
+                if not options.do_left_to_right_print:
+                    column=bits_per_line-column-bits
+                x=column*bit_width
+                box_height=height*SVG_ROW_HEIGHT
+                css="field more" if layout.flags[index] & FLAG_MF else "field"
+                elements.append('<rect x="%d" y="%d" width="%d" height="%d" class="%s"/>' % (x, y, bits*bit_width, box_height, css))
+                if layout.flags[index] & FLAG_TEXT and texts[index]:
+                    text=escape(field_text(texts[index], bits, ph))
+                    elements.append('<text x="%d" y="%d">%s</text>' % (x+bits*bit_width//2, y+box_height//2, text))
+            y+=height*SVG_ROW_HEIGHT
+
+        header=('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d">' % (width+2, y+2, width+2, y+2),
+                '<style>text{font-family:monospace;font-size:%dpx;text-anchor:middle;dominant-baseline:central}'
+                ' .number{font-size:%dpx} .field{fill:none;stroke:black}</style>' % (SVG_FONT_SIZE, SVG_FONT_SIZE*3//4),
+                '<g transform="translate(1,1)">')
+        return "\n".join(header+tuple(elements)+("</g>", "</svg>"))
+
+
+class JsonRenderer(Renderer):
+    """
+    This class renders the layout as a JSON document: the fields, with their
+    bit offset and length, and the rows of the diagram, with the fragments
+    they are made of.
+    """
+    name="json"
+    description="JSON document with the fields and rows of the layout"
+
+    def render(self, layout, options):
+        return json.dumps(layout_document(layout), indent=2)
+
+
+class NdjsonRenderer(Renderer):
+    """
+    This class renders the layout as newline-delimited JSON: one object per
+    fragment of each field, as described by placement_record().
+    """
+    name="ndjson"
+    description="One JSON object per field fragment"
+
+    def render(self, layout, options):
+        return "\n".join(iter_ndjson(map(layout.placement, range(0, len(layout)))))
+
+
+def placement_record(placement):
+    """
+    @return a dictionary that describes a Placement, ready to be serialized
+    as JSON. Bit columns go from "column" to "column"+"span".
+    """
+    return {"field": placement.field,
+            "name": placement.name,
+            "offset": placement.offset,
+            "length": placement.len,
+            "row": placement.row,
+            "column": placement.column,
+            "span": placement.span,
+            "mf": placement.MF,
+            "text": placement.text}
+
+
+def iter_ndjson(placements):
+    """
+    @return a generator of JSON lines, without the trailing newline, one per
+    Placement record of the supplied iterable.
+    """
+    # Same output as json.dumps(placement_record(placement)), formatted by
+    # hand, since this runs once per fragment. Names are encoded once per
+    # field.
+    line=('{"field": %d, "name": %s, "offset": %d, "length": %d, "row": %d, '
+          '"column": %d, "span": %d, "mf": %s, "text": %s}')
+    booleans=("false", "true")
+    field=None
+    for placement in placements:
+        if placement.field!=field:
+            field=placement.field
+            name=json.dumps(placement.name)
+        yield line % (field, name, placement.offset, placement.len, placement.row, placement.column,
+                      placement.span, booleans[placement.MF], booleans[placement.text])
+
+
+def iter_fields(layout):
+    """
+    @return a generator of (name, offset, length) tuples, one per protocol
+    field of the supplied Layout, in order.
+    """
+    fields=layout.fields
+    offsets=layout.offsets
+    start=0
+    for index in range(1, len(fields)+1):
+        if index==len(fields) or fields[index]!=fields[start]:
+            end=offsets[index] if index<len(fields) else layout.total_bits
+            yield layout.names[fields[start]], offsets[start], end-offsets[start]
+            start=index
+
+
+def row_document(layout, row):
+    """
+    @return a dictionary that describes a row of the layout: the bit it
+    starts at, the number of lines it takes and its fragments. Fragments
+    refer to their field by index; "text" tells whether the field name is
+    printed in the fragment and "more" whether the field goes on in the
+    next fragment.
+    """
+    return {"offset": layout.offsets[row.start],
+            "height": row.height,
+            "fragments": [{"field": layout.fields[index],
+                           "offset": layout.offsets[index],
+                           "length": layout.lengths[index],
+                           "text": bool(layout.flags[index] & FLAG_TEXT),
+                           "more": bool(layout.flags[index] & FLAG_MF)}
+                          for index in range(row.start, row.end)]}
+
+
+def layout_document(layout):
+    """
+    @return a dictionary that describes the supplied Layout, ready to be
+    serialized as JSON.
+    """
+    return {"bits_per_line": layout.bits_per_line,
+            "total_bits": layout.total_bits,
+            "fields": [{"name": name, "offset": offset, "length": length}
+                       for name, offset, length in iter_fields(layout)],
+            "rows": [row_document(layout, row) for row in layout.rows]}
+
+
+# Registered renderers, by format name
+renderers={}
+
+
+def register_renderer(renderer):
+    """
+    Makes an output format available to Protocol.render_formats() and to the
+    --format command line option. A renderer registered with the name of an
+    existing format replaces it.
+    @param renderer is an instance of a Renderer subclass.
+    """
+    renderers[renderer.name]=renderer
+
+
+def get_renderer(name):
+    """
+    @return the Renderer registered for the supplied format name.
+    @raise ProtocolException if there is no such format.
+    """
+    renderer=renderers.get(name)
+    if renderer is None:
+        raise ProtocolException("FATAL: Unknown output format (%s)" % name)
+    return renderer
+
+
+def parse_formats(formats):
+    """
+    @return a tuple of format names, checked against the registered ones.
+    @param formats is either a comma-separated string or an iterable of
+    format names.
+    @raise ProtocolException if some format is unknown or none is given.
+    """
+    if isinstance(formats, str):
+        formats=formats.split(",")
+    formats=tuple(formats)
+    if len(formats)==0:
+        raise ProtocolException("FATAL: No output format supplied")
+    for name in formats:
+        get_renderer(name)
+    return formats
+
+
+for renderer in (AsciiRenderer(), MarkdownRenderer(), SvgRenderer(), JsonRenderer(), NdjsonRenderer()):
+    register_renderer(renderer)
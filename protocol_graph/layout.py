@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the layout engine. It turns a list of protocol fields    #
+#  into an immutable description of the rows and fragments that make up the    #
+#  ASCII diagram, so the same layout can be rendered any number of times.      #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Sequence
+from itertools import accumulate, count
+
+# INTERNAL IMPORTS
+from protocol_graph.fields import FieldList
+from protocol_graph.constants import NUMPY_MIN_FIELDS, LAYOUT_SMALL_FIELDS
+
+# OPTIONAL IMPORTS
+try:
+    import numpy
+except ImportError:
+    numpy=None
+
+# Bits of Layout.flags
+FLAG_MF   = 0x01   # More fragments of the same field follow
+FLAG_TEXT = 0x02   # The fragment carries the text of its field
+
+
+class Fragment(namedtuple("Fragment", ["text", "len", "MF", "row", "column"])):
+    """
+    This class represents a piece of a protocol field, as it is placed on the
+    diagram. Fields that do not fit in the line they start on are split into
+    several fragments. Only one of them carries the text of the field.
+    text is the text printed inside the fragment (possibly empty), len is the
+    number of bits it covers, MF is True when more fragments of the same field
+    follow, row is the index of the first diagram row the fragment is placed
+    on and column is the bit it starts at within that row.
+    """
+    __slots__ = ()
+
+
+class Row(namedtuple("Row", ["start", "end", "height"])):
+    """
+    This class represents a group of fragments printed together. start and end
+    delimit the fragments of the row in Layout.fragments and height is the
+    number of diagram rows the group takes. Height is only larger than one for
+    fields that are a multiple of the line length and start on a new line,
+    and, in layouts compiled with blocks, for the full lines of split fields.
+    """
+    __slots__ = ()
+
+
+class Placement(namedtuple("Placement", ["field", "name", "offset", "len", "row", "column", "span", "MF", "text"])):
+    """
+    This class represents a fragment of a protocol field together with the
+    field it belongs to, for tools that need field positions rather than a
+    diagram. field is the index of the field and name its name, offset the
+    bit the fragment starts at and len the number of bits it covers. row is
+    the first diagram row the fragment is placed on, column the bit it
+    starts at within that row and span the number of bit columns it takes.
+    MF is True when more fragments of the same field follow, and text is
+    True for the fragment the name of the field is printed in.
+    """
+    __slots__ = ()
+
+
+class _LayoutView(Sequence):
+    """
+    Read-only sequence that builds the records of a Layout on demand, so
+    huge layouts don't need one namedtuple per fragment in memory.
+    """
+    __slots__ = ("_length", "_get")
+
+    def __init__(self, length, get):
+        self._length=length
+        self._get=get
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple([self._get(i) for i in range(*index.indices(self._length))])
+        if index<0:
+            index+=self._length
+        if not 0<=index<self._length:
+            raise IndexError("layout index out of range")
+        return self._get(index)
+
+    def __iter__(self):
+        return map(self._get, range(0, self._length))
+
+
+class Layout():
+    """
+    This class represents the compiled layout of a protocol header for a given
+    number of bits per line. Layouts are immutable and hashable, so they can
+    be cached and shared between any number of renders.
+    The layout is stored column-wise: for each fragment, the bit offset it
+    starts at, its length, the index of the field it belongs to and a byte
+    of FLAG_* bits, plus the index of the fragment each row starts with. The
+    fragments attribute gives a sequence view of Fragment records built from
+    those columns, and the rows attribute a tuple of Row records.
+    """
+    __slots__ = ("bits_per_line", "names", "offsets", "lengths", "fields",
+                 "flags", "row_starts", "total_bits", "_rows", "_texts", "_hash")
+
+    def __init__(self, bits_per_line, names, offsets, lengths, fields, flags, row_starts):
+        """
+        Class constructor. Layouts are built by compile_layout().
+        @param bits_per_line is the number of bits printed on each line.
+        @param names is a tuple with the text of each protocol field.
+        @param offsets is an array with the first bit of each fragment.
+        @param lengths is an array with the length in bits of each fragment.
+        @param fields is an array with the field index of each fragment.
+        @param flags is a bytes object with the FLAG_* bits of each fragment.
+        @param row_starts is an array with the first fragment of each row.
+        """
+        init=object.__setattr__
+        init(self, "bits_per_line", bits_per_line)
+        init(self, "names", names)
+        init(self, "offsets", offsets)
+        init(self, "lengths", lengths)
+        init(self, "fields", fields)
+        init(self, "flags", flags)
+        init(self, "row_starts", row_starts)
+        init(self, "total_bits", offsets[-1]+lengths[-1] if len(offsets) else 0)
+        init(self, "_rows", None)
+        init(self, "_texts", None)
+        init(self, "_hash", None)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Layout instances are immutable")
+
+
+    @property
+    def fragments(self):
+        """
+        @return a sequence of the Fragment records of this layout. Records
+        are built as they are accessed.
+        """
+        return _LayoutView(len(self.offsets), self.fragment)
+
+
+    def fragment(self, index):
+        """
+        @return the Fragment record for the supplied fragment index.
+        """
+        offset=self.offsets[index]
+        flags=self.flags[index]
+        text=self.names[self.fields[index]] if flags & FLAG_TEXT else ""
+        return Fragment(text, self.lengths[index], bool(flags & FLAG_MF),
+                        offset//self.bits_per_line, offset%self.bits_per_line)
+
+
+    def placement(self, index):
+        """
+        @return the Placement record for the supplied fragment index.
+        """
+        offset=self.offsets[index]
+        length=self.lengths[index]
+        flags=self.flags[index]
+        field=self.fields[index]
+        return Placement(field, self.names[field], offset, length, offset//self.bits_per_line,
+                         offset%self.bits_per_line, min(length, self.bits_per_line),
+                         bool(flags & FLAG_MF), bool(flags & FLAG_TEXT))
+
+
+    @property
+    def rows(self):
+        """
+        A tuple with the Row records of the layout. Rows are looked up once
+        per rendered line, so they are built the first time they are needed.
+        """
+        if self._rows is None:
+            bits_per_line=self.bits_per_line
+            lengths=self.lengths
+            starts=self.row_starts.tolist()
+            ends=starts[1:]+[len(self.offsets)]
+            object.__setattr__(self, "_rows", tuple([Row(start, end, lengths[start]//bits_per_line if lengths[start]>bits_per_line else 1)
+                                                     for start, end in zip(starts, ends)]))
+        return self._rows
+
+
+    def row_fragments(self, row):
+        """
+        @return a tuple with the fragments that are part of the supplied Row.
+        """
+        return self.fragments[row.start:row.end]
+
+
+    def span(self, fragment):
+        """
+        @return a (start, end) tuple with the columns covered by the supplied
+        fragment. Fragments that take several rows cover the whole line.
+        """
+        return fragment.column, min(fragment.column+fragment.len, self.bits_per_line)
+
+
+    def texts(self):
+        """
+        @return a tuple with the text printed inside each fragment. It is
+        built the first time it is requested.
+        """
+        if self._texts is None:
+            names=self.names
+            object.__setattr__(self, "_texts", tuple([names[f] if flags & FLAG_TEXT else ""
+                                                      for f, flags in zip(self.fields, self.flags)]))
+        return self._texts
+
+
+    def __eq__(self, other):
+        if not isinstance(other, Layout):
+            return NotImplemented
+        return (self.bits_per_line==other.bits_per_line and
+                list(self.offsets)==list(other.offsets) and
+                list(self.lengths)==list(other.lengths) and
+                bytes(self.flags)==bytes(other.flags) and
+                self.texts()==other.texts())
+
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((self.bits_per_line,
+                tuple(self.offsets), bytes(self.flags), self.texts())))
+        return self._hash
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def __repr__(self):
+        return "Layout(bits_per_line=%i, fragments=%i, rows=%i)" % (self.bits_per_line, len(self.offsets), len(self.row_starts))
+
+
+    def __reduce__(self):
+        return Layout, (self.bits_per_line, self.names, self.offsets, self.lengths,
+                        self.fields, self.flags, self.row_starts)
+
+
+def _column(values, limit):
+    """
+    @return an unsigned 64-bit array with the supplied values, or a plain
+    list if limit (the largest value) does not fit in 64 bits.
+    """
+    if limit < 1 << 64:
+        return array("Q", values)
+    return list(values)
+
+
+def _split_field(offset, length, bits_per_line, blocks=False):
+    """
+    Splits a field that does not fit in the line it starts on.
+    @param blocks makes the full lines that follow the first line of the
+    field a single fragment, with the text, when a shorter tail follows.
+    @return a (offsets, lengths, text_index) tuple, with the offset and
+    length of each fragment and the index of the one that holds the text.
+    """
+    column=offset%bits_per_line
+    end=offset+length
+    offsets=[]
+    if column:
+        # The field starts with the bits left in the current line
+        offsets.append(offset)
+        offset+=bits_per_line-column
+    rest=end-offset
+    if rest<=bits_per_line or rest%bits_per_line==0:
+        # The rest takes a line, or it is aligned and a multiple of the line
+        # length, so it is printed as a single block
+        offsets.append(offset)
+        text=len(offsets)-1
+    elif blocks:
+        offsets.append(offset)
+        offsets.append(end-rest%bits_per_line)
+        text=len(offsets)-2
+    else:
+        offsets.extend(range(offset, end, bits_per_line))
+        text=len(offsets)-2
+    # If the first chunk is at least as long as the rest, the text goes there
+    if column and bits_per_line-column>=rest:
+        text=0
+    lengths=[b-a for a, b in zip(offsets, offsets[1:])]
+    lengths.append(end-offsets[-1])
+    return offsets, lengths, text
+
+
+def _compile_small(lengths, bits_per_line, blocks=False):
+    """
+    Computes the columns of a layout with a plain loop over the fields. For
+    headers with a few fields, this is cheaper than setting up the prefix
+    sums _compile_python() works with.
+    """
+    offsets=[]
+    frag_lengths=[]
+    fields=[]
+    flags=bytearray()
+    row_starts=[]
+    offset=0
+    for index, length in enumerate(lengths):
+        column=offset%bits_per_line
+        if column==0:
+            row_starts.append(len(offsets))
+        if column+length<=bits_per_line or (column==0 and length%bits_per_line==0):
+            # The field fits in its line, or takes whole lines
+            offsets.append(offset)
+            frag_lengths.append(length)
+            fields.append(index)
+            flags.append(FLAG_TEXT)
+        else:
+            pieces, piece_lengths, text=_split_field(offset, length, bits_per_line, blocks)
+            row_starts+=[len(offsets)+i for i, start in enumerate(pieces) if i and start%bits_per_line==0]
+            offsets+=pieces
+            frag_lengths+=piece_lengths
+            fields+=[index]*len(pieces)
+            piece_flags=bytearray((FLAG_MF,))*(len(pieces)-1)+bytearray(1)
+            piece_flags[text]|=FLAG_TEXT
+            flags+=piece_flags
+        offset+=length
+    if offset >= 1 << 64:
+        return offsets, frag_lengths, array("Q", fields), bytes(flags), array("Q", row_starts)
+    return (array("Q", offsets), array("Q", frag_lengths), array("Q", fields),
+            bytes(flags), array("Q", row_starts))
+
+
+def _compile_python(lengths, bits_per_line, blocks=False):
+    """
+    Computes the columns of a layout one field at a time. Fields that fit in
+    the line they start on are copied in runs, so only the fields that must
+    be split are processed individually.
+    """
+    lengths=lengths.tolist()
+    starts=list(accumulate(lengths, initial=0))
+    total=starts.pop()
+    offsets=[]
+    frag_lengths=[]
+    fields=[]
+    flags=bytearray()
+    # Flags of a field split in two, depending on the piece that gets the text
+    halves=(bytes((FLAG_MF, FLAG_TEXT)), bytes((FLAG_MF|FLAG_TEXT, 0)))
+    special=[i for i, start, length in zip(count(), starts, lengths) if start%bits_per_line+length>bits_per_line]
+    special.append(len(lengths))
+    previous=0
+    for index in special:
+        if previous<index:
+            offsets+=starts[previous:index]
+            frag_lengths+=lengths[previous:index]
+            fields+=range(previous, index)
+            flags+=bytes((FLAG_TEXT,))*(index-previous)
+        if index==len(lengths):
+            break
+        previous=index+1
+        start=starts[index]
+        length=lengths[index]
+        first=bits_per_line-start%bits_per_line
+        if first<bits_per_line and length-first<=bits_per_line:
+            # The common case: the field ends on the next line
+            offsets+=(start, start+first)
+            frag_lengths+=(first, length-first)
+            fields+=(index, index)
+            flags+=halves[first>=length-first]
+            continue
+        pieces, piece_lengths, text=_split_field(start, length, bits_per_line, blocks)
+        offsets+=pieces
+        frag_lengths+=piece_lengths
+        fields+=[index]*len(pieces)
+        piece_flags=bytearray((FLAG_MF,))*(len(pieces)-1)+bytearray(1)
+        piece_flags[text]|=FLAG_TEXT
+        flags+=piece_flags
+    row_starts=[i for i, offset in enumerate(offsets) if offset%bits_per_line==0]
+    return (_column(offsets, total), _column(frag_lengths, total),
+            _column(fields, len(lengths)), bytes(flags), _column(row_starts, len(offsets)))
+
+
+def _compile_numpy(lengths, bits_per_line, blocks=False):
+    """
+    Computes the columns of a layout with NumPy: the number of fragments of
+    every field is derived from the prefix sum of the field lengths, and the
+    offset of each fragment from its position within the field.
+    """
+    np=numpy
+    bpl=bits_per_line
+    length=np.frombuffer(lengths, dtype=lengths.typecode).astype(np.int64)
+    ends=np.cumsum(length)
+    start=ends-length
+    column=start%bpl
+    special=column+length>bpl
+    has_first=special&(column>0)
+    first=bpl-column
+    rest=np.where(has_first, length-first, length)
+    single=(rest<=bpl)|(rest%bpl==0)
+    counts=np.where(special, has_first+np.where(single, 1, 2 if blocks else rest//bpl+1), 1)
+    text=np.where(single, has_first, counts-2)
+    text=np.where(special, np.where(has_first&(first>=rest), 0, text), 0)
+    base=np.where(has_first, start+first, start)
+
+    # Expand the per-field columns to one entry per fragment
+    fields=np.repeat(np.arange(len(length), dtype=np.int64), counts)
+    local=np.arange(len(fields), dtype=np.int64)-np.repeat(np.cumsum(counts)-counts, counts)
+    if blocks:
+        # The full lines of a split field are one piece, and its tail the next
+        step=np.repeat(np.where(single, bpl, rest//bpl*bpl), counts)
+    else:
+        step=bpl
+    offsets=np.where(local==0, np.repeat(start, counts),
+                     np.repeat(base, counts)+(local-np.repeat(has_first, counts))*step)
+    frag_lengths=np.diff(offsets, append=ends[-1])
+    flags=(local<np.repeat(counts-1, counts))*FLAG_MF+(local==np.repeat(text, counts))*FLAG_TEXT
+    row_starts=np.flatnonzero(offsets%bpl==0)
+
+    def column_of(values):
+        result=array("Q")
+        result.frombytes(values.astype(np.uint64).tobytes())
+        return result
+    return (column_of(offsets), column_of(frag_lengths), column_of(fields),
+            flags.astype(np.uint8).tobytes(), column_of(row_starts))
+
+
+def compile_layout(fields, bits_per_line, use_numpy=None, blocks=False):
+    """
+    Splits a list of protocol fields into the fragments and rows that make up
+    the ASCII diagram. Fields that span more than one line are divided in
+    chunks, so no fragment ever crosses the end of a line, unless it is aligned
+    to the start of a line and its length is a multiple of the line length.
+    Fragment positions are computed from the prefix sum of the field lengths,
+    which allows a vectorized implementation when NumPy is installed.
+    @param fields is a FieldList or an iterable of (text, len) tuples.
+    @param bits_per_line is the number of bits printed on each line.
+    @param use_numpy selects the NumPy implementation. By default, it is used
+    when NumPy is available and there are at least NUMPY_MIN_FIELDS fields.
+    @param blocks makes the full lines of a split field, between its first
+    line and a shorter tail, a single fragment that takes several rows, as
+    if it were a multiple of the line length. Renders that elide blank
+    lines use it, so their cost does not depend on the field lengths.
+    @return a Layout instance.
+    """
+    if not isinstance(fields, FieldList):
+        fields=list(fields)
+        fields=FieldList([f[0] for f in fields], [f[1] for f in fields])
+    lengths=fields.lengths
+    if use_numpy is None:
+        use_numpy=numpy is not None and len(lengths)>=NUMPY_MIN_FIELDS
+    # NumPy works with signed 64-bit offsets, so huge headers stay in Python
+    if use_numpy and numpy is not None and len(lengths) and lengths.typecode!="Q" and \
+       len(lengths)*max(lengths) < 1 << 62:
+        columns=_compile_numpy(lengths, bits_per_line, blocks)
+    elif len(lengths)<LAYOUT_SMALL_FIELDS:
+        columns=_compile_small(lengths, bits_per_line, blocks)
+    else:
+        columns=_compile_python(lengths, bits_per_line, blocks)
+    return Layout(bits_per_line, fields.names, *columns)
+
+
+def _concat(head, tail):
+    """
+    @return the concatenation of two layout columns, keeping the array type
+    when both of them are arrays of the same kind.
+    """
+    if isinstance(head, array) and isinstance(tail, array) and head.typecode==tail.typecode:
+        return head+tail
+    return list(head)+list(tail)
+
+
+def relayout(layout, fields, first_field, blocks=False):
+    """
+    Builds the layout of a new list of protocol fields from the layout of an
+    old one, when both lists are equal up to a given field. The fragments of
+    a field only depend on the bit it starts at and on its length, so the
+    fragments of the common fields are kept as they are, and only the fields
+    from first_field on are compiled again.
+    @param layout is the Layout of the old field list.
+    @param fields is the new FieldList.
+    @param first_field is the index of the first field that differs between
+    the old and the new lists.
+    @param blocks must match the value the old layout was compiled with.
+    @return a Layout instance, equal to compile_layout(fields, ...).
+    """
+    bits_per_line=layout.bits_per_line
+    first=bisect_left(layout.fields, first_field)
+    start=layout.offsets[first] if first<len(layout) else layout.total_bits
+    column=start%bits_per_line
+    rest=fields[first_field:]
+    # A nameless field fills the row up to the first new field, so it starts
+    # at the same column as it will in the final layout
+    skip=1 if column else 0
+    if skip:
+        rest=FieldList([""], [column])+rest
+    tail=compile_layout(rest, bits_per_line, blocks=blocks)
+    shift=start-column
+    offsets=[offset+shift for offset in tail.offsets[skip:]]
+    field_indexes=[index+first_field-skip for index in tail.fields[skip:]]
+    row_starts=[index+first-skip for index in tail.row_starts[skip:]]
+    total=offsets[-1]+tail.lengths[-1] if offsets else start
+    result=Layout(bits_per_line, fields.names,
+                  _concat(layout.offsets[:first], _column(offsets, total)),
+                  _concat(layout.lengths[:first], tail.lengths[skip:]),
+                  _concat(layout.fields[:first], _column(field_indexes, len(fields))),
+                  layout.flags[:first]+tail.flags[skip:],
+                  _concat(layout.row_starts[:bisect_left(layout.row_starts, first)],
+                          _column(row_starts, first+len(tail))))
+    if layout._texts is not None:
+        object.__setattr__(result, "_texts", layout._texts[:first]+tail.texts()[skip:])
+    return result
+
+
+def iter_placements(fields, bits_per_line):
+    """
+    Places a list of protocol fields one at a time, without building a
+    Layout. Fragments are computed in the same way as compile_layout() does,
+    so the records match the ones of Layout.placement(), but memory use does
+    not grow with the number of fields.
+    @param fields is a FieldList or an iterable of (text, len) tuples. It is
+    consumed lazily.
+    @param bits_per_line is the number of bits printed on each line.
+    @return a generator of Placement records, in layout order.
+    """
+    offset=0
+    for index, (name, length) in enumerate(fields):
+        column=offset%bits_per_line
+        # Most fields fit in the line they start on
+        if column+length<=bits_per_line:
+            yield Placement(index, name, offset, length, offset//bits_per_line, column, length, False, True)
+            offset+=length
+            continue
+        pieces, piece_lengths, text=_split_field(offset, length, bits_per_line)
+        last=len(pieces)-1
+        for piece, (start, bits) in enumerate(zip(pieces, piece_lengths)):
+            yield Placement(index, name, start, bits, start//bits_per_line, start%bits_per_line,
+                            min(bits, bits_per_line), piece<last, piece==text)
+        offset+=length
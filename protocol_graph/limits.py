@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the resource limits applied to untrusted specs. The size #
+#  of a diagram is estimated from the field lengths and the render options     #
+#  before anything is rendered, so specs that would produce huge diagrams are  #
+#  rejected straight away.                                                     #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import time
+from collections import namedtuple
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.rows import Measurement, measure_fields
+
+
+class RenderLimits(namedtuple("RenderLimits", ["max_fields", "max_rows", "max_bytes", "max_time"])):
+    """
+    This class represents the resources a protocol may use. max_fields is the
+    number of fields of the spec, max_rows the number of lines of the diagram,
+    max_bytes its size once encoded as UTF-8 and max_time the number of
+    seconds rendering may take. A value of None means no limit.
+    """
+    __slots__ = ()
+
+    def check(self, fields, options):
+        """
+        Checks, before rendering, that a protocol fits within the limits.
+        @param fields is the FieldList of the protocol.
+        @param options is the RenderOptions instance it will be rendered with.
+        @raise ProtocolLimitException if some limit is exceeded.
+        """
+        self.check_fields(len(fields))
+        if self.max_rows is None and self.max_bytes is None:
+            return
+        size=estimate_size(fields, options)
+        if self.max_rows is not None and size.rows>self.max_rows:
+            raise ProtocolLimitException("FATAL: Diagram too long (%i lines, the limit is %i)" % (size.rows, self.max_rows))
+        if self.max_bytes is not None and size.bytes>self.max_bytes:
+            raise ProtocolLimitException("FATAL: Diagram too large (%i bytes, the limit is %i)" % (size.bytes, self.max_bytes))
+
+
+    def check_fields(self, count):
+        """
+        Checks that a spec with the supplied number of fields is acceptable.
+        @raise ProtocolLimitException if there are too many fields.
+        """
+        if self.max_fields is not None and count>self.max_fields:
+            raise ProtocolLimitException("FATAL: Too many fields (%i, the limit is %i)" % (count, self.max_fields))
+
+
+    def check_diagram(self, diagram):
+        """
+        Checks that an already rendered diagram fits within the size limits.
+        @raise ProtocolLimitException if some limit is exceeded.
+        """
+        if self.max_rows is not None and diagram.count("\n")+1>self.max_rows:
+            raise ProtocolLimitException("FATAL: Diagram too long (%i lines, the limit is %i)" % (diagram.count("\n")+1, self.max_rows))
+        if self.max_bytes is not None and len(diagram)>self.max_bytes:
+            size=len(diagram.encode("utf-8"))
+            if size>self.max_bytes:
+                raise ProtocolLimitException("FATAL: Diagram too large (%i bytes, the limit is %i)" % (size, self.max_bytes))
+
+
+    def iter_lines(self, lines):
+        """
+        @return a generator of the supplied lines that raises a
+        ProtocolLimitException once rendering has taken longer than max_time
+        seconds. The clock starts when the first line is requested.
+        """
+        if self.max_time is None:
+            yield from lines
+            return
+        deadline=time.monotonic()+self.max_time
+        for count, line in enumerate(lines):
+            if count%LIMITS_CHECK_LINES==0 and time.monotonic()>deadline:
+                raise ProtocolLimitException("FATAL: Rendering took longer than %s seconds" % self.max_time)
+            yield line
+
+
+# Limits used when the caller does not supply any: no limits at all
+NO_LIMITS=RenderLimits(None, None, None, None)
+
+
+def estimate_size(fields, options):
+    """
+    Computes the size of the diagram of a list of fields from the field
+    lengths alone, in O(fields) time, without laying out the fields.
+    @param fields is a FieldList.
+    @param options is the RenderOptions instance to render with.
+    @return a Measurement instance. The size in bytes refers to UTF-8. It is
+    exact for ASCII borders and an upper bound otherwise.
+    """
+    return measure_fields(fields, options)
@@ -55,10 +55,14 @@
 #                                                                              #
 ################################################################################
 
+# STANDARD LIBRARY IMPORTS
+import sys
+from datetime import date
+
 # INTERNAL IMPORTS
 from protocol_graph.constants import *
 from protocol_graph.exceptions import *
-from protocol_graph import Protocol
+from protocol_graph import Protocol, RenderLimits, NO_LIMITS, iter_render_many, iter_ndjson, parse_formats, specs
 
 class Main():
     """
@@ -71,7 +75,7 @@ class Main():
         Class constructor. Nothing fancy.
         """
         self.cmd_line_args=None             # Copy of the user argv
-        self.protocols=[]                   # List of protocols to print out
+        self.sources=[]                     # Specs and spec files to print out, in order
         self.bits_per_line=None             # Number of bits per line to print
         self.skip_numbers=None              # True to avoid printing bit units and tens
         self.hdr_char_start=None            # Character for start of the border line
@@ -81,6 +85,13 @@ class Main():
         self.hdr_char_sep=None              # Field separator character
         self.do_left_to_right_print=True    # Filed Print From Left To Right
         self.ph_num_per_bit=1               # PlaceHold Number Per Bits
+        self.jobs=1                         # Number of worker processes
+        self.elide_rows=None                # Collapse longer runs of blank lines
+        self.max_fields=None                # Maximum number of fields per spec
+        self.max_rows=None                  # Maximum number of lines per diagram
+        self.max_bytes=None                 # Maximum size of each diagram, in bytes
+        self.max_time=None                  # Maximum rendering time per diagram, in seconds
+        self.formats=None                   # Output formats (None: ASCII diagram only)
 
 
     def display_help(self):
@@ -99,11 +110,18 @@ class Main():
         print("OPTIONS:")
         print(" -b, --bits <n>          : Number of bits per line")
         print("-ph","--placeholder <n>  : Number of placeholder unit per bit")
-        print(" -f, --file              : Read specs from a text file")
+        print(" -f, --file <file>       : Read specs from a text file (\"-\" for standard input)")
+        print(" -j, --jobs <n>          : Render specs using <n> worker processes")
         print(" -lsb                    : Print Field From Lsb to Msb")
         print(" -h, --help              : Displays this help information")
         print(" -n, --no-numbers        : Do not print bit numbers on top of the header")
+        print(" -e, --elide <n>         : Collapse runs of more than <n> blank lines in long fields")
         print(" -V, --version           : Displays current version")
+        print(" --format <list>         : Comma-separated output formats (ascii, markdown, svg, json, ndjson)")
+        print(" --max-fields <n>        : Reject specs with more than <n> fields")
+        print(" --max-rows <n>          : Reject diagrams with more than <n> lines")
+        print(" --max-bytes <n>         : Reject diagrams larger than <n> bytes")
+        print(" --max-time <seconds>    : Abort diagrams that take longer to render")
         print(" --evenchar  <char>      : Character for the even positions of horizontal table borders")
         print(" --oddchar   <char>      : Character for the odd positions of horizontal table borders")
         print(" --startchar <char>      : Character that starts horizontal table borders")
@@ -125,38 +143,54 @@ class Main():
         print(self.get_usage())
 
 
-    def parse_config_file(self, filename):
+    def iter_config_file(self, filename):
         """
-        This method parses the supplied configuration file and adds any protocols to our
-        list of protocols to print.
-        @return The number of protocols parsed
+        This method reads the supplied configuration file line by line and
+        yields the protocol specs it contains, so arbitrarily large files can
+        be processed without loading them in memory. A filename of "-" means
+        standard input.
+        @return a generator of textual protocol specs.
         """
-
-        i=0
-        # Read the contents of the whole file
+        # Open the file, unless we are reading from standard input
         try:
-            f = open(filename)
-            lines = f.readlines()
-            f.close()
+            f = sys.stdin if filename=="-" else open(filename)
         except:
             print("Error while reading file %s. Please make sure it exists and it's readable." % filename)
             sys.exit(1)
 
         # Parse protocol specs, line by line
-        for line in lines:
-            # Sanitize the line
-            line=line.strip()
+        i=0
+        try:
+            for line in f:
+                # Sanitize the line
+                line=line.strip()
 
-            # If it starts with #, or is an empty line ignore it
-            if line.startswith("#") or len(line)==0:
-                continue
+                # If it starts with #, or is an empty line ignore it
+                if line.startswith("#") or len(line)==0:
+                    continue
 
-            # If we have something else, treat it as a protocol spec
-            proto=Protocol(line)
-            self.protocols.append(proto)
-            i+=1
+                # If we have something else, treat it as a protocol spec
+                i+=1
+                yield line
+        finally:
+            if f is not sys.stdin:
+                f.close()
 
-        return i
+        if i<=0:
+            print("ERROR: No protocol specifications found in the supplied file (%s)" % filename)
+            sys.exit(1)
+
+
+    def iter_specs(self):
+        """
+        @return a generator of all the protocol specs supplied by the user,
+        in command-line order. Spec files are read as the generator advances.
+        """
+        for kind, value in self.sources:
+            if kind=="file":
+                yield from self.iter_config_file(value)
+            else:
+                yield value
 
 
     def parse_cmd_line_args(self, argv, is_config_file=False):
@@ -190,12 +224,10 @@ class Main():
                     if (i+1)>=len(argv):
                         return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
                     skip_arg=True
-                    # Parse the config file
-                    protos = self.parse_config_file(argv[i+1])
-                    if protos <= 0:
-                        return OP_FAILURE, "No protocol specifications found in the supplied file (%s)" % argv[i+1]
+                    # The file is read while the diagrams are printed
+                    self.sources.append(("file", argv[i+1]))
                 
-                if argv[i]=="-ph" or argv[i]=="--placeholder":
+                elif argv[i]=="-ph" or argv[i]=="--placeholder":
                     # Make sure we have an actual parameter after the flag
                     if (i+1)>=len(argv):
                         return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
@@ -222,6 +254,57 @@ class Main():
                     except:
                         return OP_FAILURE, "Invalid number of bits per line supplied (%s)" % argv[i+1]
 
+                # Number of worker processes
+                elif argv[i]=="-j" or argv[i]=="--jobs":
+                    # Make sure we have an actual parameter after the flag
+                    if (i+1)>=len(argv):
+                        return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
+                    skip_arg=True
+                    try:
+                        self.jobs=int(argv[i+1])
+                        if self.jobs<=0:
+                            return OP_FAILURE, "Invalid number of jobs supplied (%s)" % argv[i+1]
+                    except:
+                        return OP_FAILURE, "Invalid number of jobs supplied (%s)" % argv[i+1]
+
+                # Elide long runs of blank lines
+                elif argv[i]=="-e" or argv[i]=="--elide":
+                    # Make sure we have an actual parameter after the flag
+                    if (i+1)>=len(argv):
+                        return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
+                    skip_arg=True
+                    try:
+                        self.elide_rows=int(argv[i+1])
+                        if self.elide_rows<0:
+                            return OP_FAILURE, "Invalid number of blank lines supplied (%s)" % argv[i+1]
+                    except:
+                        return OP_FAILURE, "Invalid number of blank lines supplied (%s)" % argv[i+1]
+
+                # Resource limits
+                elif argv[i] in ["--max-fields", "--max-rows", "--max-bytes", "--max-time"]:
+                    # Make sure we have an actual parameter after the flag
+                    if (i+1)>=len(argv):
+                        return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
+                    skip_arg=True
+                    try:
+                        value=float(argv[i+1]) if argv[i]=="--max-time" else int(argv[i+1])
+                        if value<=0:
+                            return OP_FAILURE, "Invalid limit supplied for %s (%s)" % (argv[i], argv[i+1])
+                    except:
+                        return OP_FAILURE, "Invalid limit supplied for %s (%s)" % (argv[i], argv[i+1])
+                    setattr(self, argv[i][2:].replace("-", "_"), value)
+
+                # Output formats
+                elif argv[i]=="--format":
+                    # Make sure we have an actual parameter after the flag
+                    if (i+1)>=len(argv):
+                        return OP_FAILURE, "Expected parameter after %s\n%s" % (argv[i], self.get_usage())
+                    skip_arg=True
+                    try:
+                        self.formats=parse_formats(argv[i+1])
+                    except ProtocolException:
+                        return OP_FAILURE, "Invalid output format supplied (%s)" % argv[i+1]
+
                 # Avoid displaying numbers on top of the header
                 elif argv[i]=="-n" or argv[i]=="--no-numbers":
                     self.skip_numbers=True
@@ -303,13 +386,13 @@ class Main():
                     # will call sys.exit() itself, so there is no need to do
                     # error checking here.
                     try:
-                        proto = Protocol(spec)
-                        self.protocols.append(proto)
+                        Protocol(spec)
+                        self.sources.append(("spec", spec))
                     except ProtocolException as e:
                         print("ERROR: %s" % str(e))
                         sys.exit(1)
 
-        if len(self.protocols)==0:
+        if len(self.sources)==0:
             print("ERROR: Missing protocol")
             sys.exit(1)
 
@@ -317,6 +400,84 @@ class Main():
 
 
 
+    def get_render_options(self):
+        """
+        @return a dictionary with the render options supplied through the
+        command line. Options the user did not supply are set to None, so
+        they don't override the ones in each spec.
+        """
+        numbers=None
+        if self.skip_numbers is not None:
+            numbers=not self.skip_numbers
+        return {"bits_per_line":self.bits_per_line,
+                "ph_num_per_bit":self.ph_num_per_bit,
+                "hdr_char_start":self.hdr_char_start,
+                "hdr_char_end":self.hdr_char_end,
+                "hdr_char_fill_odd":self.hdr_char_fill_odd,
+                "hdr_char_fill_even":self.hdr_char_fill_even,
+                "hdr_char_sep":self.hdr_char_sep,
+                "do_print_top_tens":numbers,
+                "do_print_top_units":numbers,
+                "do_left_to_right_print":self.do_left_to_right_print,
+                "elide_rows":self.elide_rows}
+
+
+    def get_render_limits(self):
+        """
+        @return a RenderLimits instance with the limits supplied through the
+        command line, or None if the user did not supply any.
+        """
+        limits=RenderLimits(self.max_fields, self.max_rows, self.max_bytes, self.max_time)
+        if limits==NO_LIMITS:
+            return None
+        return limits
+
+
+    def iter_outputs(self):
+        """
+        @return a generator with one entry per spec supplied by the user:
+        either a generator of the lines of its ASCII diagram, the list of its
+        outputs when other formats were requested, or the ProtocolException
+        raised while parsing it or checking it against the limits. Diagrams
+        are written as their lines are rendered and nothing is cached, so
+        memory use does not grow with the number of specs.
+        """
+        limits=self.get_render_limits()
+        options=self.get_render_options()
+        for spec in self.iter_specs():
+            try:
+                proto=Protocol(specs.protocols.get(spec, spec), limits)
+                if self.formats is None or self.formats==("ascii",):
+                    yield proto.iter_lines(options)
+                else:
+                    yield proto.render_formats(self.formats, options)
+            except ProtocolException as e:
+                yield e
+
+
+    def iter_layout_records(self):
+        """
+        @return a generator with one entry per spec supplied by the user:
+        either a generator of the NDJSON lines of the spec or the
+        ProtocolException raised while parsing it or checking its size
+        against the limits. Lines are produced as the fields of the spec
+        are placed.
+        """
+        limits=self.get_render_limits() or NO_LIMITS
+        options=self.get_render_options()
+        for spec in self.iter_specs():
+            try:
+                proto=Protocol(specs.protocols.get(spec, spec), limits)
+                proto.set_options(options)
+                # Refuse oversized specs before the first record, as we do
+                # when rendering diagrams
+                limits.check(proto.field_list, proto.get_options())
+            except ProtocolException as e:
+                yield e
+                continue
+            yield limits.iter_lines(iter_ndjson(proto.iter_layout()))
+
+
     def run(self):
         """
         This is Protocol's 'core' method: parses command line argument and prints
@@ -330,36 +491,47 @@ class Main():
             print("ERROR: %s" % err)
             sys.exit(1)
 
-        # Print the appropriate protocol headers
-        for i in range(0, len(self.protocols)):
-
-            # Modify the properties of the object if the user passed any
-            # options that require it
-            if self.bits_per_line is not None:
-                self.protocols[i].bits_per_line = self.bits_per_line
-            if self.skip_numbers is not None:
-                if self.skip_numbers is True:
-                    self.protocols[i].do_print_top_tens=False
-                    self.protocols[i].do_print_top_units=False
-                else:
-                    self.protocols[i].do_print_top_tens=True
-                    self.protocols[i].do_print_top_units=True
-            if self.hdr_char_end is not None:
-                self.protocols[i].hdr_char_end=self.hdr_char_end
-            if self.hdr_char_start is not None:
-                self.protocols[i].hdr_char_start=self.hdr_char_start
-            if self.hdr_char_fill_even is not None:
-                self.protocols[i].hdr_char_fill_even=self.hdr_char_fill_even
-            if self.hdr_char_fill_odd is not None:
-                self.protocols[i].hdr_char_fill_odd=self.hdr_char_fill_odd
-            if self.hdr_char_sep is not None:
-                self.protocols[i].hdr_char_sep=self.hdr_char_sep
-            self.protocols[i].do_left_to_right_print=self.do_left_to_right_print
-            self.protocols[i].ph_num_per_bit=self.ph_num_per_bit
-
-            print(self.protocols[i])
-            if len(self.protocols)>1 and i!=len(self.protocols)-1:
-                print("")
+        # Print the appropriate protocol headers. Specs are read, rendered and
+        # written one at a time (or a few chunks at a time, when using more
+        # than one job), so we never hold the whole input in memory. With a
+        # single job, diagrams are written line by line and not cached.
+        # When NDJSON is the only format, records are written as each field is
+        # placed, so huge specs are never rendered or held in memory.
+        if self.formats==("ndjson",):
+            results=self.iter_layout_records()
+        elif self.jobs==1:
+            results=self.iter_outputs()
+        else:
+            results=iter_render_many(self.iter_specs(), self.get_render_options(), self.jobs,
+                                     limits=self.get_render_limits(), formats=self.formats)
+        failed=False
+        first=True
+        for diagram in results:
+            if not first:
+                sys.stdout.write("\n")
+            first=False
+            if isinstance(diagram, ProtocolException):
+                failed=True
+                sys.stdout.write("ERROR: %s\n" % str(diagram))
+            elif not isinstance(diagram, (str, list)):
+                try:
+                    for line in diagram:
+                        sys.stdout.write(line)
+                        sys.stdout.write("\n")
+                except ProtocolException as e:
+                    failed=True
+                    sys.stdout.write("ERROR: %s\n" % str(e))
+            else:
+                # With several formats, outputs are separated by a blank line
+                # too, in the order they were requested
+                if isinstance(diagram, list):
+                    diagram="\n\n".join(diagram)
+                sys.stdout.write(diagram)
+                sys.stdout.write("\n")
+            sys.stdout.flush()
+
+        if failed:
+            sys.exit(1)
 
 
 # Main function
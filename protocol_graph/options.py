@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the set of options that control how a protocol header is #
+#  rendered, along with the code that parses them from a textual spec.         #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+from collections import namedtuple
+
+# INTERNAL IMPORTS
+from protocol_graph.exceptions import *
+
+
+class RenderOptions(namedtuple("RenderOptions", [
+        "bits_per_line",            # Number of bits per line
+        "ph_num_per_bit",           # Placeholder Num Per Bits
+        "hdr_char_start",           # Character for start of the border line
+        "hdr_char_end",             # Character for end of the border line
+        "hdr_char_fill_odd",        # Fill character for border odd positions
+        "hdr_char_fill_even",       # Fill character for border even positions
+        "hdr_char_sep",             # Field separator character
+        "do_print_top_tens",        # True: print top numbers for bit tens
+        "do_print_top_units",       # True: print top numbers for bit units
+        "do_left_to_right_print",   # True: print field from left to right dirction
+        "elide_rows",               # Collapse longer runs of blank lines (None: never)
+        ])):
+    """
+    This class represents the effective set of options used to render a
+    protocol header. Field names match the attributes of the Protocol class.
+    Instances are immutable and hashable, so they can be used as cache keys.
+    """
+    __slots__ = ()
+
+    def updated(self, overrides):
+        """
+        @return a copy of the options where every entry of the overrides that
+        is not None replaces the current value.
+        @param overrides is a RenderOptions instance or a mapping of option
+        names to values.
+        @raise ProtocolException if the overrides contain unknown options or
+        values that are not valid.
+        """
+        if not overrides:
+            return self
+        if isinstance(overrides, RenderOptions):
+            overrides=overrides._asdict()
+        changes={}
+        for name, value in dict(overrides).items():
+            check=_OPTION_CHECKS.get(name)
+            if check is None:
+                raise ProtocolException("FATAL: Unknown render option (%s)" % name)
+            if value is not None:
+                if not check(value):
+                    raise ProtocolException("FATAL: Invalid value for render option %s (%r)" % (name, value))
+                changes[name]=value
+        return self._replace(**changes)
+
+
+    def canonical(self):
+        """
+        @return a copy of the options where every border and separator
+        character is replaced by its placeholder from CANONICAL_CHARS. Any
+        two option sets that only differ in those characters have the same
+        canonical form, and so the same canonical render.
+        """
+        return self._replace(**CANONICAL_CHARS)
+
+
+    def translation(self):
+        """
+        @return a str.translate() table that turns a canonical render into
+        the render for these options.
+        """
+        return {ord(placeholder): getattr(self, name) for name, placeholder in CANONICAL_CHARS.items()}
+
+
+def _is_positive(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value>=1
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value>=0
+
+
+def _is_char(value):
+    return isinstance(value, str) and len(value)==1
+
+
+def _is_flag(value):
+    return isinstance(value, bool)
+
+
+# Check each render option value must pass, the same parse_options() and the
+# command line apply
+_OPTION_CHECKS={
+    "bits_per_line":          _is_positive,
+    "ph_num_per_bit":         _is_positive,
+    "hdr_char_start":         _is_char,
+    "hdr_char_end":           _is_char,
+    "hdr_char_fill_odd":      _is_char,
+    "hdr_char_fill_even":     _is_char,
+    "hdr_char_sep":           _is_char,
+    "do_print_top_tens":      _is_flag,
+    "do_print_top_units":     _is_flag,
+    "do_left_to_right_print": _is_flag,
+    "elide_rows":             _is_count,
+}
+
+# Private use characters that stand for the border and separator characters
+# in canonical renders. They are never printed.
+CANONICAL_CHARS={
+    "hdr_char_start":     "\ue000",
+    "hdr_char_end":       "\ue001",
+    "hdr_char_fill_odd":  "\ue002",
+    "hdr_char_fill_even": "\ue003",
+    "hdr_char_sep":       "\ue004",
+}
+
+# Options used when neither the spec nor the caller say otherwise
+DEFAULT_OPTIONS=RenderOptions(
+    bits_per_line=32,
+    ph_num_per_bit=1,
+    hdr_char_start="+",
+    hdr_char_end="+",
+    hdr_char_fill_odd="+",
+    hdr_char_fill_even="-",
+    hdr_char_sep="|",
+    do_print_top_tens=True,
+    do_print_top_units=True,
+    do_left_to_right_print=True,
+    elide_rows=None,
+)
+
+
+def parse_options(opts):
+    """
+    Parses the option part of a protocol spec (whatever follows the '?' sign).
+    @param opts is the comma-separated list of label=value elements.
+    @return a dictionary that maps Protocol attribute names to their values.
+    Only the options present in the spec are included.
+    @raise ProtocolException in case the supplied options are not valid
+    """
+    result={}
+    for opt in opts.split(","):
+        try:
+            var, value = opt.split("=")
+            if var.lower()=="bits":
+                result["bits_per_line"]=int(value)
+                if result["bits_per_line"]<=0:
+                    raise ProtocolException("FATAL: Invalid value for 'bits' option (%s)" % value)
+            elif var.lower()=="elide":
+                result["elide_rows"]=int(value)
+                if result["elide_rows"]<0:
+                    raise ProtocolException("FATAL: Invalid value for 'elide' option (%s)" % value)
+            elif var.lower()=="numbers":
+                if value.lower() in ["0", "n", "no", "none", "false"]:
+                    result["do_print_top_tens"]=False
+                    result["do_print_top_units"]=False
+                elif value.lower() in ["1", "y", "yes", "none", "true"]:
+                    result["do_print_top_tens"]=True
+                    result["do_print_top_units"]=True
+                else:
+                    raise ProtocolException("FATAL: Invalid value for 'numbers' option (%s)" % value)
+            elif var.lower() in ["oddchar", "evenchar", "startchar", "endchar", "sepchar"]:
+                if len(value)>1 or len(value)<=0:
+                    raise ProtocolException("FATAL: Invalid value for '%s' option (%s)" % (var, value))
+                else:
+                    if var.lower()=="oddchar":
+                        result["hdr_char_fill_odd"]=value
+                    elif var.lower()=="evenchar":
+                        result["hdr_char_fill_even"]=value
+                    elif var.lower()=="startchar":
+                        result["hdr_char_start"]=value
+                    elif var.lower()=="endchar":
+                        result["hdr_char_end"]=value
+                    elif var.lower()=="sepchar":
+                        result["hdr_char_sep"]=value
+        except ProtocolException:
+            raise
+        except:
+            raise ProtocolException("FATAL: Invalid options specification (%s)" % opt)
+    return result
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the row builder. It turns a compiled Layout into the     #
+#  lines of the ASCII diagram, building each line from a list of pieces that   #
+#  are joined once. Diagrams printed from right to left are obtained by        #
+#  mirroring the pieces of each line.                                          #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import codecs
+from collections import namedtuple
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.tables import get_tables
+from protocol_graph.layout import FLAG_MF
+
+
+class Measurement(namedtuple("Measurement", ["rows", "width", "bytes"])):
+    """
+    This class represents the size of a rendered diagram: rows is its number
+    of text lines, width the length of the longest line, in characters, and
+    bytes the size of the encoded diagram, with its lines joined by newlines
+    as str() does.
+    """
+    __slots__ = ()
+
+
+def get_options_tables(options):
+    """
+    @return the shared RenderTables instance that matches the supplied
+    RenderOptions.
+    """
+    return get_tables(options.bits_per_line, options.ph_num_per_bit, options.hdr_char_start,
+                      options.hdr_char_end, options.hdr_char_fill_odd, options.hdr_char_fill_even,
+                      options.do_left_to_right_print)
+
+
+def field_text(text, bits, ph_num_per_bit):
+    """
+    @return the text to print inside a fragment of the supplied number of bits.
+    If the text is too long, we truncate it, and add a dot at the end.
+    """
+    width=(bits*2*ph_num_per_bit)-1
+    if len(text) > width:
+        text=text[0:width]
+        if len(text)>ph_num_per_bit:
+            text=text[0:-1]+"."
+    return text
+
+
+def iter_header_lines(options, tables=None):
+    """
+    @return a generator of the lines printed on top of the diagram: the bit
+    numbers, if requested, and the top border.
+    """
+    if tables is None:
+        tables=get_options_tables(options)
+    numbers=tables.top_numbers(options.do_print_top_tens, options.do_print_top_units)
+    if numbers is not None:
+        yield from numbers.split("\n")
+    yield tables.horizontal()
+
+
+def big_row_line(text, index, lines_to_print, options, tables):
+    """
+    @return one of the lines of a row that takes several diagram lines.
+    @param text is the (already truncated) text of the field.
+    @param index is the position of the line within the row.
+    @param lines_to_print is the number of lines of the row, not counting
+    the border below it.
+    """
+    # Let's figure out which character we need to use to start and end the
+    # current line
+    if index%2==1:
+        start_line=options.hdr_char_start
+        end_line=options.hdr_char_end
+    else:
+        start_line=options.hdr_char_sep
+        end_line=options.hdr_char_sep
+
+    if index==lines_to_print//2:
+        return start_line + str.center(text, len(tables.blank)) + end_line
+    return start_line + tables.blank + end_line
+
+
+def iter_row_lines(layout, index, options, tables=None):
+    """
+    @return a generator of the lines that make up a row of the layout: the
+    line (or lines) with the field texts, followed by the border below them.
+    @param layout is a compiled Layout.
+    @param index is the position of the row in layout.rows.
+    @param options is the RenderOptions instance to render with. Its number
+    of bits per line must match the one of the layout.
+    """
+    if tables is None:
+        tables=get_options_tables(options)
+    ph=options.ph_num_per_bit
+    sep=options.hdr_char_sep
+    row=layout.rows[index]
+
+    # Fields that are a multiple of the line length and start on a new line
+    # take several lines, like the full lines of split fields when blank
+    # lines are elided. The field text goes on the central one.
+    if row.height>1:
+        fragment=layout.fragments[row.start]
+        text=field_text(fragment.text, fragment.len, ph)
+        lines_to_print=row.height*2-1
+        central_line=lines_to_print//2
+        next_len=layout.lengths[row.start+1] if layout.flags[row.start] & FLAG_MF else None
+        i=0
+        while i<lines_to_print:
+
+            # If we were asked to elide blank lines, replace runs that are too
+            # long with a single marker line. This keeps the cost independent
+            # of the field length.
+            if options.elide_rows is not None and i!=central_line:
+                run_end=central_line if i<central_line else lines_to_print
+                if run_end-i > options.elide_rows:
+                    yield ELIDE_CHAR + tables.blank + ELIDE_CHAR
+                    i=run_end
+                    continue
+
+            yield big_row_line(text, i, lines_to_print, options, tables)
+            i+=1
+
+        # The full lines of a split field may be followed by its tail
+        yield _floor_line(tables.bits_per_line, next_len, options, tables)
+        return
+
+    # Regular rows are memoized: the same rows show up in many diagrams, so
+    # they are keyed by their fragments and the only option that is not part
+    # of the tables, and built once.
+    start, end=row.start, row.end
+    texts=layout.texts()[start:end]
+    lengths=tuple(layout.lengths[start:end])
+    next_len=layout.lengths[end] if layout.flags[end-1] & FLAG_MF else None
+    key=(sep, texts, lengths, next_len)
+    lines=tables.get_row(key)
+    if lines is None:
+        lines=tables.put_row(key, tuple(_iter_regular_lines(texts, lengths, next_len, options, tables)))
+    yield from lines
+
+
+def _iter_regular_lines(texts, lengths, next_len, options, tables):
+    """
+    @return a generator of the lines of a row that takes a single diagram
+    line: the line with the field texts and the border below it.
+    @param texts and lengths describe the fragments of the row.
+    @param next_len is the length of the first fragment of the next row if
+    the last fragment of this one continues there, None otherwise.
+    """
+    bits_per_line=tables.bits_per_line
+    ph=options.ph_num_per_bit
+    sep=options.hdr_char_sep
+
+    # Collect the pieces of the line, mirror them if we print from right to
+    # left, and join them once.
+    pieces=[str.center(field_text(text, bits, ph), (bits*2*ph)-1) for text, bits in zip(texts, lengths)]
+    if not options.do_left_to_right_print:
+        pieces.reverse()
+    line=sep + sep.join(pieces) + sep
+    last_len=lengths[-1]
+    bits_in_line=sum(lengths)
+
+    # If the line is not complete, this is the last row of the diagram. We
+    # just close the fields we printed.
+    if bits_in_line<bits_per_line:
+        if options.do_left_to_right_print:
+            yield line
+        else:
+            yield "  "*(bits_per_line-bits_in_line)*ph + line
+        yield tables.horizontal(bits_in_line)
+        return
+    yield line
+    yield _floor_line(last_len, next_len, options, tables)
+
+
+def _floor_line(last_len, next_len, options, tables):
+    """
+    @return the border below a full row.
+    @param last_len is the length of the last fragment of the row.
+    @param next_len is the length of the first fragment of the next row if
+    the last fragment of this one continues there, None otherwise.
+    """
+    bits_per_line=tables.bits_per_line
+    ph=options.ph_num_per_bit
+
+    # When we have a fragmented field, we may need to suppress the floor of
+    # the field, so the current line connects with the one that follows. E.g.:
+    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+    # |            field16            |                               |
+    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+                               +
+    # |                             field                             |
+    # +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+    if next_len is None or next_len <= bits_per_line-last_len:
+        return tables.horizontal()
+
+    # Print some +-+-+ to cover the previous fields
+    line_left=tables.border(bits_per_line-last_len)
+    if len(line_left)==0:
+        line_left=options.hdr_char_start
+
+    # Now print some empty space to cover the part that we can join
+    # with the field below.
+    # Case 1: If the next field reaches the end of its line, then we
+    # need to print whitespace until the end our line
+    if next_len >= bits_per_line:
+        line_center=" "*((2*last_len*ph)-1)
+        line_right=options.hdr_char_end
+    # Case 2: the field in the next row is not big enough to cover all
+    # the space we'd like to join, so we just print whitespace to cover
+    # as much as we can
+    else:
+        line_center=" "*((2*(next_len-(bits_per_line-last_len))*ph)-1)
+        line_right=tables.border(bits_per_line-next_len)
+
+    if options.do_left_to_right_print:
+        return line_left+line_center+line_right
+    return line_right+line_center+line_left
+
+
+def iter_window_lines(layout, first_row, start, end, options):
+    """
+    @return a generator of the lines that cover diagram rows [start, end):
+    the border above the first of them, followed by the text line and the
+    border below each row. The lines match the ones iter_lines() yields for
+    those rows. Rows that take several lines are cut at the window edges,
+    unless blank lines are elided, in which case they are printed whole.
+    @param layout is a Layout that covers, at least, every field that
+    overlaps the window and the last bit of the row above it.
+    @param first_row is the diagram row the first row of the layout is
+    placed on.
+    """
+    tables=get_options_tables(options)
+    bits_per_line=layout.bits_per_line
+    if start==0:
+        yield tables.horizontal()
+
+    # Line 0 is the top border, the text of diagram row r is line 2r+1 and
+    # the border below it is line 2r+2.
+    window_start=2*start
+    window_end=2*end+1
+    for index, row in enumerate(layout.rows):
+        top=first_row+layout.offsets[row.start]//bits_per_line
+        first_line=2*top+1
+        if first_line>=window_end:
+            break
+        lo=max(window_start-first_line, 0)
+        hi=min(window_end-first_line, 2*row.height)
+        if hi<=lo:
+            continue
+        if row.height>1 and options.elide_rows is None:
+            text=field_text(layout.texts()[row.start], layout.lengths[row.start], options.ph_num_per_bit)
+            lines_to_print=row.height*2-1
+            for i in range(lo, min(hi, lines_to_print)):
+                yield big_row_line(text, i, lines_to_print, options, tables)
+            if hi>lines_to_print:
+                yield tables.horizontal()
+        elif row.height>1:
+            yield from iter_row_lines(layout, index, options, tables)
+        else:
+            yield from tuple(iter_row_lines(layout, index, options, tables))[lo:hi]
+
+
+def iter_lines(layout, options):
+    """
+    @return a generator of all the lines of the ASCII diagram for the
+    supplied Layout and RenderOptions.
+    """
+    tables=get_options_tables(options)
+    yield from iter_header_lines(options, tables)
+    for index in range(0, len(layout.rows)):
+        yield from iter_row_lines(layout, index, options, tables)
+
+
+def text_fragment(offset, length, bits_per_line, blocks=False):
+    """
+    Finds the fragment a field is printed in, the way compile_layout()
+    splits fields, without splitting it.
+    @param offset is the first bit of the field.
+    @param length is the length of the field, in bits.
+    @param blocks is the value compile_layout() is called with.
+    @return a (bits, block) tuple: the length of the fragment that holds the
+    text of the field, and whether it is a block that takes several lines.
+    """
+    column=offset%bits_per_line
+    if column+length<=bits_per_line:
+        return length, False
+    first=bits_per_line-column if column else 0
+    rest=length-first
+    if rest<=bits_per_line or rest%bits_per_line==0:
+        if column and first>=rest:
+            return first, False
+        return rest, rest>bits_per_line
+    # The text goes on the full lines of the field, or on the last of them
+    if blocks:
+        bits=rest-rest%bits_per_line
+        return bits, bits>bits_per_line
+    return bits_per_line, False
+
+
+def measure_fields(fields, options, encoding="utf-8", lines=None):
+    """
+    Computes the size of the diagram iter_lines() would produce from the
+    field lengths alone, in O(fields) time, without laying out the fields.
+    Each diagram row takes two full-width lines, except the rows of blocks
+    whose blank lines are elided, and only the bit numbers, an incomplete
+    last row and long texts in blocks have a different width.
+    @param fields is a FieldList.
+    @param options is the RenderOptions instance to render with.
+    @param encoding is the encoding used to compute the size in bytes.
+    @param lines is a function that returns the lines of the diagram. If some
+    border character takes more than one byte in the encoding, they are
+    encoded one at a time to get the exact size. Without it, the size is an
+    upper bound in that case.
+    @return a Measurement instance.
+    """
+    bits_per_line=options.bits_per_line
+    ph=options.ph_num_per_bit
+    width=2*bits_per_line*ph+1
+    total=0
+    blocks=[]           # (text, bits) of the fields with a text fragment that is not a plain row
+    texts=[]            # (text, bits) of the fields with non-ASCII texts
+    elide=options.elide_rows is not None
+    for text, length in zip(fields.names, fields.lengths):
+        if length>bits_per_line-total%bits_per_line or not text.isascii():
+            bits, block=text_fragment(total, length, bits_per_line, elide)
+            if block:
+                blocks.append((text, bits))
+            if not text.isascii():
+                texts.append((text, bits))
+        total+=length
+
+    rows=-(-total//bits_per_line)
+    numbers=(options.do_print_top_tens is True)+(options.do_print_top_units is True)
+    count=numbers+1+2*rows
+    chars=numbers*(width-1)+width+2*rows*width
+    # The line of tens is newline terminated, so without units an empty
+    # line follows it
+    if options.do_print_top_tens is True and options.do_print_top_units is not True:
+        count+=1
+    # Only the last row may be incomplete. In LSB mode it is padded anyway.
+    if options.do_left_to_right_print and total%bits_per_line:
+        chars-=2*(width-(2*(total%bits_per_line)*ph+1))
+
+    # Blocks may have runs of blank lines elided. Their text is only
+    # truncated to the length of the field, so it may not fit in the line.
+    longest=width
+    for text, bits in blocks:
+        run=bits//bits_per_line-1
+        if elide and run>options.elide_rows:
+            count-=2*(run-1)
+            chars-=2*(run-1)*width
+        text=field_text(text, bits, ph)
+        if len(text)+2>width:
+            chars+=len(text)+2-width
+            longest=max(longest, len(text)+2)
+    chars+=count-1
+
+    # Then account for characters that don't take one byte
+    border=(options.hdr_char_start+options.hdr_char_end+options.hdr_char_fill_odd+
+            options.hdr_char_fill_even+options.hdr_char_sep+ELIDE_CHAR+" \n0123456789")
+    widest=max(len(codecs.encode(c, encoding)) for c in border)
+    size=chars
+    if widest>1:
+        if lines is not None:
+            return Measurement(count, longest, sum(len(data) for data in iter_encoded(lines(), encoding)))
+        size=chars*widest
+    for text, bits in texts:
+        text=field_text(text, bits, ph)
+        size+=len(codecs.encode(text, encoding))-len(text)
+    return Measurement(count, longest, size)
+
+
+def iter_encoded(lines, encoding="utf-8"):
+    """
+    @return a generator of byte strings that, put together, make up the
+    supplied lines joined by newlines and encoded with the supplied encoding.
+    """
+    encoder=codecs.getincrementalencoder(encoding)()
+    separator=""
+    for line in lines:
+        yield encoder.encode(separator+line)
+        separator="\n"
+    yield encoder.encode("", True)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the tables of precomputed strings (bit number rulers and #
+#  horizontal borders) shared by every protocol rendered with the same         #
+#  geometry and border characters.                                             #
+#                                                                              #
+################################################################################
+
+# STANDARD LIBRARY IMPORTS
+import threading
+from functools import lru_cache
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+
+
+class RenderTables():
+    """
+    This class holds the strings that only depend on the geometry of a diagram
+    and on the characters used to draw its borders: the bit number ruler and
+    the horizontal border lines of every width. Instances are shared, so
+    don't create them directly, use get_tables() instead.
+    """
+
+    def __init__(self, bits_per_line, ph_num_per_bit, hdr_char_start, hdr_char_end,
+                 hdr_char_fill_odd, hdr_char_fill_even, do_left_to_right_print):
+        """
+        Class constructor. Parameters match the Protocol attributes of the
+        same name.
+        """
+        self.bits_per_line=bits_per_line
+        self.ph_num_per_bit=ph_num_per_bit
+        self.hdr_char_start=hdr_char_start
+        self.hdr_char_end=hdr_char_end
+        self.do_left_to_right_print=do_left_to_right_print
+        self.blank=" "*(bits_per_line*2*ph_num_per_bit-1)    # Inside of an empty line
+
+        # Bit tens and units on top of the header. Each bit takes the same
+        # number of characters, so in LSB mode we just reverse the bits.
+        tens=[]
+        units=[]
+        for i in range(0, bits_per_line):
+            if str(i)[-1:]=="0":
+                tens.append(" "*(ph_num_per_bit*2-1)+str(i)[0])
+            else:
+                tens.append("  "*ph_num_per_bit)
+            units.append(" "*(ph_num_per_bit*2-1)+str(i)[-1:])
+        if not do_left_to_right_print:
+            tens.reverse()
+            units.reverse()
+        self.tens="".join(tens)
+        self.units="".join(units)
+
+        # Border fill for the whole line. Borders of any width are obtained
+        # by slicing it.
+        if do_left_to_right_print:
+            self._fill=(hdr_char_fill_even+hdr_char_fill_odd)*bits_per_line*ph_num_per_bit
+        else:
+            self._fill=(hdr_char_fill_odd+hdr_char_fill_even)*bits_per_line*ph_num_per_bit
+        self._horizontals={}
+        self._borders={}
+        self._rows={}                                        # Rendered rows, see get_row()
+        self._rows_chars=0                                   # Characters held by self._rows
+        self._rows_lock=threading.Lock()
+
+
+    def top_numbers(self, do_print_top_tens, do_print_top_units):
+        """
+        @return a string representing the bit units and bit tens on top of the
+        protocol header, or None if neither of them is printed. The returned
+        string is not \n terminated, but it may contain a newline character
+        in the middle.
+        """
+        result=""
+        if do_print_top_tens is True:
+            result+=self.tens+"\n"
+        if do_print_top_units is True:
+            result+=self.units
+        return result if len(result)>0 else None
+
+
+    def horizontal(self, width=None):
+        """
+        @return the horizontal border line that separates field rows.
+        @param width controls how many field bits the line should cover. By
+        default, if no width is supplied, the line covers the whole length of
+        the header.
+        """
+        if width is None:
+            width=self.bits_per_line
+        line=self._horizontals.get(width)
+        if line is None:
+            if width<=0:
+                line=""
+            elif self.do_left_to_right_print:
+                line=self.hdr_char_start + self._fill[0:width*2*self.ph_num_per_bit-1] + self.hdr_char_end
+            else:
+                line=("  "*(self.bits_per_line-width)*self.ph_num_per_bit + self.hdr_char_end +
+                      self._fill[1:width*2*self.ph_num_per_bit] + self.hdr_char_start)
+            self._horizontals[width]=line
+        return line
+
+
+    def border(self, width):
+        """
+        @return the horizontal border that covers the supplied number of bits,
+        without the padding horizontal() adds in LSB mode. This is the piece
+        used to close the fields next to a fragmented one.
+        """
+        line=self._borders.get(width)
+        if line is None:
+            line=self.horizontal(width)
+            if not self.do_left_to_right_print:
+                line=line[(self.bits_per_line-width)*2*self.ph_num_per_bit:]
+            self._borders[width]=line
+        return line
+
+
+    def get_row(self, key):
+        """
+        @return the tuple of lines stored for the supplied row key by
+        put_row(), or None if the row is not known.
+        """
+        return self._rows.get(key)
+
+
+    def put_row(self, key, lines):
+        """
+        Stores the lines of a rendered row, so rows that are repeated within
+        a diagram or across diagrams are built once and share their strings.
+        The table is bounded: it holds at most ROWS_CACHE_SIZE rows and
+        ROWS_CACHE_CHARS characters, and the oldest rows are dropped to make
+        room. Rows longer than that are not stored.
+        @param key identifies the fragments of the row. It must include any
+        render option that is not part of these tables.
+        @return the supplied lines.
+        """
+        size=sum(map(len, lines))
+        if size>ROWS_CACHE_CHARS:
+            return lines
+        with self._rows_lock:
+            rows=self._rows
+            if key in rows:
+                return lines
+            while rows and (len(rows)>=ROWS_CACHE_SIZE or self._rows_chars+size>ROWS_CACHE_CHARS):
+                self._rows_chars-=sum(map(len, rows.pop(next(iter(rows)))))
+            rows[key]=lines
+            self._rows_chars+=size
+        return lines
+
+
+    def clear_rows(self):
+        """
+        Drops every row stored by put_row().
+        """
+        with self._rows_lock:
+            self._rows.clear()
+            self._rows_chars=0
+
+
+    def rows_size(self):
+        """
+        @return a (rows, characters) tuple with the number of rows stored by
+        put_row() and the number of characters they hold.
+        """
+        with self._rows_lock:
+            return len(self._rows), self._rows_chars
+
+
+@lru_cache(maxsize=TABLES_CACHE_SIZE)
+def get_tables(bits_per_line, ph_num_per_bit, hdr_char_start, hdr_char_end,
+               hdr_char_fill_odd, hdr_char_fill_even, do_left_to_right_print):
+    """
+    @return the RenderTables instance for the supplied geometry and border
+    characters. Instances are created on first use and then shared.
+    """
+    return RenderTables(bits_per_line, ph_num_per_bit, hdr_char_start, hdr_char_end,
+                        hdr_char_fill_odd, hdr_char_fill_even, do_left_to_right_print)
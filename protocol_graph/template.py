@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the render templates. Many diagrams share the same field #
+#  lengths and only differ in the field names, so the diagram for a list of    #
+#  lengths is rendered once with blank names, and the names of each diagram   #
+#  are then placed in the slots the template leaves for them.                  #
+#                                                                              #
+################################################################################
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.fields import FieldList
+from protocol_graph.layout import FLAG_TEXT, compile_layout
+from protocol_graph.limits import NO_LIMITS
+from protocol_graph.rows import get_options_tables, field_text, iter_header_lines, iter_lines
+from protocol_graph.cache import RenderCache
+
+
+class RenderTemplate():
+    """
+    This class represents the ASCII diagram for a list of field lengths and a
+    set of render options, with a slot for the name of each field. The text
+    between slots is stored as is, so filling a template only truncates and
+    centers each name in its slot and joins the pieces together. Templates
+    are immutable, so they can be shared between any number of threads.
+    """
+    __slots__ = ("lengths", "options", "static", "slots")
+
+    def __init__(self, lengths, options, static, slots):
+        """
+        Class constructor. Templates are built by compile_template().
+        @param lengths is a tuple with the length in bits of each field.
+        @param options is the RenderOptions instance the template renders with.
+        @param static is a tuple with the text before, between and after the
+        slots, so it has one more entry than slots.
+        @param slots is a tuple of (field, bits, width) tuples: the index of
+        the field whose name goes in the slot, the length of the fragment it
+        is printed in, used to truncate it, and the width it is centered in.
+        """
+        init=object.__setattr__
+        init(self, "lengths", lengths)
+        init(self, "options", options)
+        init(self, "static", static)
+        init(self, "slots", slots)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RenderTemplate instances are immutable")
+
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+    def fill(self, names):
+        """
+        @return the ASCII diagram with the supplied field names.
+        @param names is a sequence with one name per field, or a FieldList
+        with the same lengths as the template.
+        @raise ProtocolException if the number of names does not match the
+        number of fields.
+        """
+        if isinstance(names, FieldList):
+            if tuple(names.lengths)!=self.lengths:
+                raise ProtocolException("FATAL: Field lengths don't match the template")
+            names=names.names
+        elif not isinstance(names, (list, tuple)):
+            names=list(names)
+        if len(names)!=len(self.lengths):
+            raise ProtocolException("FATAL: Expected %d field names, got %d" % (len(self.lengths), len(names)))
+        ph=self.options.ph_num_per_bit
+        static=self.static
+        pieces=[static[0]]*(2*len(self.slots)+1)
+        i=1
+        for (field, bits, width), text in zip(self.slots, static[1:]):
+            pieces[i]=str.center(field_text(names[field], bits, ph), width)
+            pieces[i+1]=text
+            i+=2
+        return "".join(pieces)
+
+
+    def __repr__(self):
+        return "<RenderTemplate: %d fields, %d slots>" % (len(self.lengths), len(self.slots))
+
+
+def compile_template(lengths, options, limits=NO_LIMITS):
+    """
+    Builds the template for a list of field lengths: the diagram is laid out
+    and rendered once with blank names, and the position of the text of each
+    field is recorded as a slot.
+    @param lengths is an iterable with the length in bits of each field.
+    @param options is the RenderOptions instance to render with.
+    @param limits is the RenderLimits instance the render is checked against.
+    @return a RenderTemplate instance.
+    @raise ProtocolLimitException if the diagram exceeds the limits.
+    """
+    lengths=tuple(lengths)
+    fields=FieldList([""]*len(lengths), lengths)
+    limits.check(fields, options)
+    layout=compile_layout(fields, options.bits_per_line, blocks=options.elide_rows is not None)
+    lines=list(limits.iter_lines(iter_lines(layout, options)))
+    tables=get_options_tables(options)
+    bits_per_line=layout.bits_per_line
+    ph=options.ph_num_per_bit
+
+    # Walk the rows, recording the line and column of each slot. The text of
+    # a regular row is on its first line, and each fragment is printed in
+    # (bits*2*ph)-1 columns after a separator. The text of a row that takes
+    # several lines is centered on its central line.
+    slots=[]
+    line=len(list(iter_header_lines(options, tables)))
+    for row in layout.rows:
+        if row.height>1:
+            run=row.height-1
+            if options.elide_rows is not None and run>options.elide_rows:
+                run=1
+            if layout.flags[row.start] & FLAG_TEXT:
+                slots.append((line+run, 1, layout.fields[row.start], layout.lengths[row.start], len(tables.blank)))
+            line+=2*run+2
+            continue
+        widths=[bits*2*ph for bits in layout.lengths[row.start:row.end]]
+        if options.do_left_to_right_print:
+            column=1
+            order=range(row.start, row.end)
+        else:
+            column=1+(bits_per_line*2*ph-sum(widths) if row.end==len(layout) else 0)
+            order=range(row.end-1, row.start-1, -1)
+        for index in order:
+            bits=layout.lengths[index]
+            if layout.flags[index] & FLAG_TEXT:
+                slots.append((line, column, layout.fields[index], bits, bits*2*ph-1))
+            column+=bits*2*ph
+        line+=2
+
+    # Cut the diagram at the slots
+    starts=[0]*len(lines)
+    for number in range(1, len(lines)):
+        starts[number]=starts[number-1]+len(lines[number-1])+1
+    diagram="\n".join(lines)
+    static=[]
+    end=0
+    for number, column, field, bits, width in slots:
+        position=starts[number]+column
+        static.append(diagram[end:position])
+        end=position+width
+    static.append(diagram[end:])
+    return RenderTemplate(lengths, options, tuple(static), tuple([slot[2:] for slot in slots]))
+
+
+# The process-wide cache used by get_template()
+template_cache=RenderCache(TEMPLATE_CACHE_SIZE)
+
+
+def get_template(lengths, options, limits=NO_LIMITS, cache=None):
+    """
+    @return the RenderTemplate for a list of field lengths and a set of
+    render options, compiling it only if it is not in the cache already.
+    @param limits is the RenderLimits instance templates are checked against
+    when they are compiled. Templates found in the cache are not checked.
+    @param cache is the RenderCache to use. Defaults to the process-wide one.
+    @raise ProtocolLimitException if the diagram exceeds the limits.
+    """
+    if cache is None:
+        cache=template_cache
+    lengths=tuple(lengths)
+    key=(lengths, options)
+    template=cache.get(key)
+    if template is None:
+        template=compile_template(lengths, options, limits)
+        cache.put(key, template)
+    return template
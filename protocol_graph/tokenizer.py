@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#                    ____            _                  _                      #
+#                   |  _ \ _ __ ___ | |_ ___   ___ ___ | |                     #
+#                   | |_) | '__/ _ \| __/ _ \ / __/ _ \| |                     #
+#                   |  __/| | | (_) | || (_) | (_| (_) | |                     #
+#                   |_|   |_|  \___/ \__\___/ \___\___/|_|                     #
+#                                                                              #
+#           == A Simple ASCII Header Generator for Network Protocols ==        #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  Written by:                                                                 #
+#                                                                              #
+#     Luis MartinGarcia.                                                       #
+#       -> E-Mail: luis.mgarc@gmail.com                                        #
+#       -> WWWW:   http://www.luismg.com                                       #
+#       -> GitHub: https://github.com/luismartingarcia                         #
+#                                                                              #
+################################################################################
+#                                                                              #
+#  This file is part of Protocol.                                              #
+#                                                                              #
+#  Copyright (C) 2014 Luis MartinGarcia (luis.mgarc@gmail.com)                 #
+#                                                                              #
+#  This program is free software: you can redistribute it and/or modify        #
+#  it under the terms of the GNU General Public License as published by        #
+#  the Free Software Foundation, either version 3 of the License, or           #
+#  (at your option) any later version.                                         #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful,             #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of              #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the               #
+#  GNU General Public License for more details.                                #
+#                                                                              #
+#  You should have received a copy of the GNU General Public License           #
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.       #
+#                                                                              #
+#  Please check file LICENSE.txt for the complete version of the license,      #
+#  as this disclaimer does not contain the full information. Also, note        #
+#  that although Protocol is licensed under the GNU GPL v3 license, it may     #
+#  be possible to obtain copies of it under different, less restrictive,       #
+#  alternative licenses. Requests will be studied on a case by case basis.     #
+#  If you wish to obtain Protocol under a different license, please contact    #
+#  the email address mentioned above.                                          #
+#                                                                              #
+#                                                                              #
+# Description:                                                                 #
+#                                                                              #
+#  This file contains the spec tokenizer for file-like input. Specs are read   #
+#  in chunks and fields are validated and handed out one at a time, so the     #
+#  memory used while parsing depends on the chunk size and not on the size     #
+#  of the spec.                                                                #
+#                                                                              #
+################################################################################
+
+# INTERNAL IMPORTS
+from protocol_graph.constants import *
+from protocol_graph.exceptions import *
+from protocol_graph.fields import Field
+from protocol_graph.limits import NO_LIMITS
+from protocol_graph.options import parse_options
+
+
+def parse_field(item):
+    """
+    Parses one item of the field list of a spec.
+    @param item is a "name:bits" string.
+    @return a Field record.
+    @raise ProtocolException if the item is not valid.
+    """
+    try:
+        text, bits = item.split(":")
+        bits=int(bits)
+    except:
+        raise ProtocolException("FATAL: Invalid field_list specification (%s)" % item)
+    if bits<=0:
+        raise ProtocolException("FATAL: Fields must be at least one bit long (%s)" % item)
+    return Field(text, bits)
+
+
+class SpecTokenizer():
+    """
+    This class reads a textual protocol spec from a text stream. Iterating
+    over an instance yields a Field record for each item of the field list,
+    as soon as it has been read and validated. Once the iteration is over,
+    the options attribute holds the options of the spec, as returned by
+    parse_options(), or None if the spec has none. The spec follows the same
+    rules as the ones given to Protocol(), except that a trailing newline is
+    ignored.
+    """
+
+    def __init__(self, fp, chunk_size=TOKENIZER_CHUNK_SIZE, limits=NO_LIMITS):
+        """
+        Class constructor.
+        @param fp is a file-like object opened in text mode.
+        @param chunk_size is the number of characters read at once.
+        @param limits is a RenderLimits instance. Specs with more fields than
+        its max_fields are rejected as soon as the extra field is read.
+        """
+        self.fp=fp                      # Stream the spec is read from
+        self.chunk_size=chunk_size      # Number of characters read at once
+        self.limits=limits              # Resource limits of the spec
+        self.options=None               # Spec options, set at the end of the spec
+        self.count=0                    # Number of fields read so far
+
+
+    def __iter__(self):
+        """
+        @return a generator of Field records, one per field of the spec.
+        @raise ProtocolException in case the spec is not valid.
+        @raise ProtocolLimitException if the spec has too many fields.
+        """
+        max_fields=self.limits.max_fields
+        pending=""
+        opts=None
+        while True:
+            chunk=self.fp.read(self.chunk_size)
+            if opts is not None:
+                # Options are short: we just collect them
+                if "?" in chunk:
+                    raise ProtocolException("FATAL: Character '?' may only be used as an option separator.")
+                opts.append(chunk)
+                if not chunk:
+                    break
+                continue
+            if chunk:
+                data=pending+chunk
+                end=data.find("?")
+                if end<0:
+                    # The last item may go on in the next chunk
+                    items=data.split(",")
+                    pending=items.pop()
+                else:
+                    items=data[:end].split(",")
+                    pending=""
+                    opts=[data[end+1:]]
+                    if "?" in opts[0]:
+                        raise ProtocolException("FATAL: Character '?' may only be used as an option separator.")
+            else:
+                items=[_strip_newline(pending)]
+            for item in items:
+                self.count+=1
+                if max_fields is not None and self.count>max_fields:
+                    self.limits.check_fields(self.count)
+                yield parse_field(item)
+            if not chunk:
+                break
+        if opts is not None:
+            self.options=parse_options(_strip_newline("".join(opts)))
+
+
+def _strip_newline(text):
+    """
+    @return the supplied text without its trailing newline, if any.
+    """
+    if text.endswith("\r\n"):
+        return text[:-2]
+    if text.endswith("\n"):
+        return text[:-1]
+    return text
@@ -53,10 +53,17 @@
 ################################################################################
 
 # STANDARD LIBRARY IMPORTS
+import io
+import os
+import pickle
+import sys
+import tempfile
 import unittest
+from unittest import mock
 
 # IMPORT PROTOCOL
 import protocol_graph as protocol
+from protocol_graph import main
 
 # List of test cases. It contains tuples of the form (protocol_spec, expected_output)
 validcases=[
@@ -234,6 +241,26 @@ Urgent Pointer:16,Options:24,Padding:8",
 |                    Options                    |    Padding    |
 +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+"""),
 
+("Field_32:32,Field_128:128?numbers=0,elide=2",
+"""+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+|                            Field_32                           |
++-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+~                                                               ~
++                           Field_128                           +
+~                                                               ~
++-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+"""),
+
+("Field_16:16,Field_120:120,Field_24:24?numbers=0,elide=1",
+"""+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+|            Field_16           |                               |
++-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+                               +
+~                                                               ~
+|                           Field_120                           |
+~                                                               ~
++               +-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+|               |                    Field_24                   |
++-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+"""),
+
 ("Field_32:32?numbers=0,startchar=1,endchar=2,oddchar=3,evenchar=4,sepchar=5", 
 """14343434343434343434343434343434343434343434343434343434343434342
 5                            Field_32                           5
@@ -274,10 +301,32 @@ invalidcases=[
 "Field_32:32?sepchar=A,",
 "Field_32:32,Field_8?sepchar=A,",
 "Field_32:32,Field_8:?sepchar=A,",
-"Field_32:32,Field_8:12,?sepchar=A,"
+"Field_32:32,Field_8:12,?sepchar=A,",
+"Field_64:64?elide=",
+"Field_64:64?elide=-1",
+"Field_64:64?elide=A",
 ]
 
 
+def run_main(argv, stdin=""):
+    """
+    Runs the command line program with the supplied arguments.
+    @param stdin is the text the program reads from standard input, or an
+    iterable of lines.
+    @return an (exit status, output) tuple.
+    """
+    output = io.StringIO()
+    with mock.patch.object(sys, "argv", ["protocol"] + argv), \
+         mock.patch.object(sys, "stdin", io.StringIO(stdin) if isinstance(stdin, str) else stdin), \
+         mock.patch.object(sys, "stdout", output):
+        try:
+            main.main()
+            code = 0
+        except SystemExit as e:
+            code = e.code
+    return code, output.getvalue()
+
+
 class ProtocolTests(unittest.TestCase):
 
     def test_regular_specs(self):
@@ -301,6 +350,522 @@ class ProtocolTests(unittest.TestCase):
             print("Testing Invalid Spec '%s'" % invalidcases[i])
             self.assertRaises(protocol.ProtocolException, protocol.Protocol, invalidcases[i])
 
+    def test_compiled_layout(self):
+        """
+        This function checks that compiling a protocol does not modify its field
+        list, that the compiled layout is reused across renders and that
+        rendering the same object several times always yields the same result.
+        """
+        p = protocol.Protocol("Field_32:32,Field_16:16,Field_56:56?numbers=0")
+        fields = list(p.field_list)
+        first = str(p)
+        self.assertEqual(first, str(p))
+        self.assertEqual(fields, list(p.field_list))
+        self.assertIs(p.compile(), p.compile())
+        layout = p.compile()
+        self.assertEqual(hash(layout), hash(protocol.Protocol("Field_32:32,Field_16:16,Field_56:56").compile()))
+        self.assertEqual([f.len for f in layout.fragments], [32, 16, 16, 32, 8])
+        self.assertEqual([(r.start, r.end, r.height) for r in layout.rows], [(0, 1, 1), (1, 3, 1), (3, 4, 1), (4, 5, 1)])
+        p.bits_per_line = 16
+        self.assertEqual([r.height for r in p.compile().rows], [2, 1, 1, 1, 1, 1])
+        # When blank lines are elided, the full lines of split fields are a
+        # single block, so the layout does not grow with the field length
+        p = protocol.Protocol("X:20000001?bits=2,elide=1")
+        self.assertEqual([f.len for f in p.compile(2, True).fragments], [20000000, 1])
+        self.assertEqual([r.height for r in p.compile(2, True).rows], [10000000, 1])
+        self.assertEqual(len(str(p).split("\n")), p.measure().rows)
+
+    def test_layout_engines(self):
+        """
+        This function checks that the pure Python and the NumPy layout engines
+        produce the same layouts, and that layouts survive a pickle round trip.
+        """
+        fields = [("F%i" % i, n) for i, n in enumerate([1, 7, 33, 64, 100, 8, 256, 3, 96, 31, 2, 129])]
+        for bits in [1, 5, 8, 16, 32, 64]:
+            layout = protocol.compile_layout(fields, bits, use_numpy=False)
+            self.assertEqual(sum(f.len for f in layout.fragments), sum(n for _, n in fields))
+            self.assertEqual(layout, pickle.loads(pickle.dumps(layout)))
+            if protocol.layout.numpy is None:
+                continue
+            other = protocol.compile_layout(protocol.FieldList(*zip(*fields)), bits, use_numpy=True)
+            self.assertEqual(list(layout.fragments), list(other.fragments))
+            self.assertEqual(list(layout.rows), list(other.rows))
+            self.assertEqual(hash(layout), hash(other))
+
+    def test_render_cache(self):
+        """
+        This function checks that render() returns the same diagrams as the
+        Protocol class, that equivalent spec and option combinations share a
+        cache entry and that the cache honours its size bound.
+        """
+        cache = protocol.RenderCache(maxsize=2)
+        tcp = protocol.render("tcp", cache=cache)
+        self.assertEqual(tcp, str(protocol.Protocol(protocol.specs.protocols["tcp"])))
+        self.assertEqual(tcp, protocol.render(protocol.specs.protocols["tcp"], cache=cache))
+        self.assertEqual(cache.stats(), protocol.CacheStats(1, 1, 0, 1, 2))
+        self.assertEqual(protocol.render(validcases[16][0], cache=cache), validcases[16][1])
+        self.assertEqual(protocol.render("Field_16:16,Field_8:8,Field_8:8", {"bits_per_line":16, "do_print_top_tens":False, "do_print_top_units":False}, cache=cache), validcases[16][1])
+        self.assertEqual(protocol.render("udp", {"bits_per_line":None}, cache=cache), str(protocol.Protocol(protocol.specs.protocols["udp"])))
+        self.assertEqual(cache.stats(), protocol.CacheStats(2, 3, 1, 2, 2))
+        self.assertRaises(protocol.ProtocolException, protocol.render, "udp", {"bits":16}, cache=cache)
+        self.assertRaises(protocol.ProtocolException, protocol.render, invalidcases[0], cache=cache)
+        for options in [{"bits_per_line": 0}, {"ph_num_per_bit": 0}, {"hdr_char_sep": "ab"},
+                        {"elide_rows": -1}, {"do_print_top_tens": 1}]:
+            self.assertRaises(protocol.ProtocolException, protocol.render, "udp", options, cache=cache)
+            self.assertRaises(protocol.ProtocolException, protocol.Protocol("A:8").render, options)
+        options = protocol.DEFAULT_OPTIONS._replace(bits_per_line=16, do_print_top_tens=False, do_print_top_units=False)
+        self.assertEqual(protocol.render("Field_16:16,Field_8:8,Field_8:8", options, cache=cache), validcases[16][1])
+        cache.resize(0)
+        self.assertEqual(cache.stats().size, 0)
+        # The cache is bounded by the memory its diagrams take too
+        maxbytes = sum(sys.getsizeof(protocol.render(s)) for s in ("udp", "tcp"))
+        cache = protocol.RenderCache(maxsize=10, maxbytes=maxbytes - 1)
+        for spec in ("udp", "tcp", "tcp"):
+            protocol.render(spec, cache=cache)
+        self.assertEqual(cache.stats(), protocol.CacheStats(1, 2, 1, 1, 10))
+        # Diagrams larger than the whole bound are not cached at all
+        protocol.render("test", cache=cache)
+        self.assertEqual(cache.stats(), protocol.CacheStats(1, 3, 1, 1, 10))
+
+    def test_render_many(self):
+        """
+        This function checks that batch rendering returns results in input
+        order, both in-process and on a pool of workers, and that invalid specs
+        produce exceptions in the result list instead of aborting the batch.
+        """
+        batch = [case[0] for case in validcases] + [invalidcases[4]] + ["tcp"]
+        expected = [case[1] for case in validcases]
+        for jobs in (1, 2):
+            results = protocol.render_many(batch, jobs=jobs, chunksize=3)
+            self.assertEqual(results[:len(expected)], expected)
+            self.assertIsInstance(results[-2], protocol.ProtocolException)
+            self.assertEqual(results[-1], str(protocol.Protocol(protocol.specs.protocols["tcp"])))
+            # Options that are not valid fail each spec, not the batch
+            results = protocol.render_many(["tcp", "udp"], {"bits_per_line": 0}, jobs=jobs)
+            self.assertEqual(len(results), 2)
+            for result in results:
+                self.assertIsInstance(result, protocol.ProtocolException)
+        self.assertRaises(protocol.ProtocolException, protocol.render_many, batch, jobs=0)
+
+    def test_render_variants(self):
+        """
+        This function checks that rendering several variants from one object
+        matches rendering each of them from scratch, including variants that
+        are obtained by translating the border characters, and that the object
+        keeps its own options.
+        """
+        spec = protocol.specs.protocols["tcp"]
+        p = protocol.Protocol(spec)
+        variants = [{}, {"bits_per_line": 16}, {"hdr_char_sep": "#", "hdr_char_fill_even": "="},
+                    protocol.DEFAULT_OPTIONS._replace(do_left_to_right_print=False, hdr_char_start="*"),
+                    {"bits_per_line": 64, "hdr_char_end": "!", "do_print_top_tens": False}]
+        results = p.render_variants(variants)
+        self.assertEqual(len(results), len(variants))
+        for variant, result in zip(variants, results):
+            q = protocol.Protocol(spec)
+            q.set_options(variant)
+            self.assertEqual(result, str(q))
+        self.assertEqual(p.get_options(), protocol.Protocol(spec).get_options())
+        self.assertRaises(protocol.ProtocolException, p.render_variants, [{"colour": "red"}])
+        odd = protocol.Protocol("AB:8,C:24")
+        self.assertEqual(odd.render_variants([{"hdr_char_sep": "!"}]), [str(protocol.Protocol("AB:8,C:24?sepchar=!"))])
+
+    def test_render_formats(self):
+        """
+        This function checks that a protocol can be rendered in several output
+        formats at once, and that every format describes the same fields.
+        """
+        import json
+        spec = protocol.specs.protocols["tcp"]
+        p = protocol.Protocol(spec)
+        ascii, markdown, svg, document = p.render_formats("ascii,markdown,svg,json")
+        self.assertEqual(ascii, str(p))
+        document = json.loads(document)
+        self.assertEqual([f["name"] for f in document["fields"]], list(p.field_list.names))
+        self.assertEqual(document["total_bits"], sum(p.field_list.lengths))
+        self.assertEqual(len(document["rows"]), len(p.compile().rows))
+        self.assertEqual(len(markdown.split("\n")), len(p.field_list)+2)
+        self.assertIn("| 16-31 | 16 | Destination Port |", markdown)
+        self.assertTrue(svg.startswith("<svg") and svg.endswith("</svg>"))
+        self.assertEqual(svg.count("<rect"), len(p.compile()))
+        self.assertEqual(protocol.render_formats(spec, ["json", "ascii"]), [p.render_formats("json")[0], ascii])
+        udp = protocol.Protocol(protocol.specs.protocols["udp"])
+        results = protocol.render_many(["udp", "A:1:2"], formats="markdown")
+        self.assertEqual(results[0], udp.render_formats(["markdown"]))
+        self.assertIsInstance(results[1], protocol.ProtocolException)
+        self.assertRaises(protocol.ProtocolException, p.render_formats, "ascii,pdf")
+        self.assertRaises(protocol.ProtocolException, p.render_formats, [])
+
+    def test_iter_layout(self):
+        """
+        This function checks that streamed placements match the compiled
+        layout, and that the NDJSON output has one record per fragment.
+        """
+        import json
+        for spec in [protocol.specs.protocols["tcp"], "A:8,B:64,C:40?bits=16", "X:3,Y:128,Z:29,W:33"]:
+            p = protocol.Protocol(spec)
+            layout = p.compile()
+            placements = list(p.iter_layout())
+            self.assertEqual(placements, [layout.placement(i) for i in range(len(layout))])
+            self.assertEqual([(f.row, f.column, f.MF) for f in layout.fragments],
+                             [(f.row, f.column, f.MF) for f in placements])
+            records = [json.loads(line) for line in p.render_formats("ndjson")[0].split("\n")]
+            self.assertEqual(len(records), len(layout))
+            self.assertEqual(sum(r["length"] for r in records), layout.total_bits)
+            self.assertEqual(sum(r["text"] for r in records), len(p.field_list))
+        self.assertEqual(list(p.iter_layout(64))[1], protocol.Placement(1, "Y", 3, 61, 0, 3, 61, True, False))
+
+    def test_cli_spec_file(self):
+        """
+        This function checks that the command line reads specs from a file
+        and from standard input one line at a time, writes each diagram as
+        soon as it is rendered, reports invalid lines with an ERROR line and
+        exits with a non-zero status if any line failed.
+        """
+        lines = "# Comment\nA:32?numbers=0\n\nB:0\nC:8?numbers=0\n"
+        expected = (str(protocol.Protocol("A:32?numbers=0")) + "\n\n" +
+                    "ERROR: FATAL: Fields must be at least one bit long (B:0)\n\n" +
+                    str(protocol.Protocol("C:8?numbers=0")) + "\n")
+        stats = protocol.render_cache.stats()
+        self.assertEqual(run_main(["-f", "-"], lines), (1, expected))
+        self.assertEqual(protocol.render_cache.stats(), stats)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "specs.txt")
+            with open(filename, "w") as f:
+                f.write(lines)
+            self.assertEqual(run_main(["-f", filename]), (1, expected))
+            with open(filename, "w") as f:
+                f.write("A:32?numbers=0\n")
+            code, output = run_main(["--file", filename, "C:8?numbers=0"])
+            self.assertEqual(code, 0)
+            self.assertEqual(output, str(protocol.Protocol("A:32?numbers=0")) + "\n\n" +
+                                     str(protocol.Protocol("C:8?numbers=0")) + "\n")
+
+        # The diagram of a line is written before the next line is read
+        written = []
+        def read_lines():
+            yield "A:32?numbers=0\n"
+            written.append(sys.stdout.getvalue())
+            yield "C:8?numbers=0\n"
+        self.assertEqual(run_main(["-f", "-"], read_lines())[0], 0)
+        self.assertEqual(written, [str(protocol.Protocol("A:32?numbers=0")) + "\n"])
+
+    def test_cli_ndjson_limits(self):
+        """
+        This function checks that the command line refuses specs whose
+        diagram exceeds --max-rows or --max-bytes before writing any NDJSON
+        record, like it does for the other formats.
+        """
+        code, output = run_main(["X:999999999", "--format", "ndjson", "--max-rows", "10"])
+        self.assertEqual(code, 1)
+        self.assertEqual(output, "ERROR: FATAL: Diagram too long (62500003 lines, the limit is 10)\n")
+        code, output = run_main(["X:64", "--format", "ndjson", "--max-bytes", "100"])
+        self.assertEqual(code, 1)
+        self.assertTrue(output.startswith("ERROR: FATAL: Diagram too large"))
+        code, output = run_main(["X:64", "--format", "ndjson", "--max-rows", "10"])
+        self.assertEqual(code, 0)
+        self.assertEqual(len(output.splitlines()), 1)
+        self.assertIn('"name":"X"', output.replace(" ", ""))
+
+    def test_concurrent_render(self):
+        """
+        This function checks that render() does not modify the object, and
+        that a single object can be rendered from several threads at once,
+        each of them with its own options.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        p = protocol.Protocol(protocol.specs.protocols["tcp"])
+        before = p.get_options()
+        variants = [{"bits_per_line": bits, "hdr_char_sep": sep} for bits in (16, 32, 64) for sep in "|!#"]
+        expected = []
+        for variant in variants:
+            q = protocol.Protocol(protocol.specs.protocols["tcp"])
+            q.set_options(variant)
+            expected.append(str(q))
+        self.assertEqual([p.render(variant) for variant in variants], expected)
+        self.assertEqual(p.get_options(), before)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(p.render, variants*20))
+        self.assertEqual(results, expected*20)
+        p.bits_per_line = 16
+        self.assertEqual(p.get_options(), before._replace(bits_per_line=16))
+        self.assertEqual(str(p), expected[0])
+        self.assertRaises(protocol.ProtocolException, p.render, {"colour": "red"})
+
+    def test_async_render(self):
+        """
+        This function checks the asyncio API: small and large specs render as
+        their synchronous counterparts, errors are returned per spec, and
+        cancelling a large render does not leave the task hanging.
+        """
+        import asyncio
+        big = ",".join("F%i:%i" % (i, i%9+1) for i in range(protocol.AIO_INLINE_FIELDS*2))
+        self.assertFalse(protocol.aio.is_small(big))
+        self.assertTrue(protocol.aio.is_small("A:8,B:24"))
+        self.assertFalse(protocol.aio.is_small("A:%i" % (protocol.AIO_INLINE_BITS+1)))
+
+        async def run():
+            results = await protocol.aio.render_many(["tcp", big, "A:0", big+"?bits=16"], concurrency=2)
+            huge = asyncio.ensure_future(protocol.aio.render(",".join("G%i:7" % i for i in range(50000)), {"bits_per_line": 64}))
+            await asyncio.sleep(0)
+            huge.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await huge
+            return results
+
+        cache = protocol.render_cache
+        cache.clear()
+        results = asyncio.run(run())
+        self.assertEqual(results[0], str(protocol.Protocol(protocol.specs.protocols["tcp"])))
+        self.assertEqual(results[1], str(protocol.Protocol(big)))
+        self.assertIsInstance(results[2], protocol.ProtocolException)
+        self.assertEqual(results[3], str(protocol.Protocol(big+"?bits=16")))
+        self.assertEqual(asyncio.run(protocol.aio.render(big)), results[1])
+        self.assertGreater(cache.stats().hits, 0)
+        cache.clear()
+
+    def test_from_stream(self):
+        """
+        This function checks that specs read from a stream, in chunks of any
+        size, give the same protocol as the same spec given as a string, and
+        that invalid specs are still rejected.
+        """
+        specs = [validcases[i][0] for i in range(0, len(validcases))]
+        specs += [protocol.specs.protocols["tcp"]+"\n", "A:8,B:300,C:70000?bits=16,sepchar=!\n"]
+        for spec in specs:
+            expected = protocol.Protocol(spec.rstrip("\n"))
+            for chunk_size in (1, 3, 16, 4096):
+                p = protocol.Protocol.from_stream(io.StringIO(spec), chunk_size=chunk_size)
+                self.assertEqual(p.field_list, expected.field_list)
+                self.assertEqual(str(p), str(expected))
+        for spec in invalidcases+["", "A:8,B:8?bits=8?", "A:8,"]:
+            for chunk_size in (1, 4, 4096):
+                self.assertRaises(protocol.ProtocolException, protocol.Protocol.from_stream, io.StringIO(spec), None, chunk_size)
+        limits = protocol.RenderLimits(3, None, None, None)
+        self.assertRaises(protocol.ProtocolLimitException, protocol.Protocol.from_stream, io.StringIO("A:1,"*10+"B:1"), limits)
+
+    def test_render_template(self):
+        """
+        This function checks that specs with the same field lengths share a
+        template, and that filling it with their names gives the same diagram
+        as rendering them, including truncated names and rows that take
+        several lines.
+        """
+        names = ["icmp-destination", "icmp-time", "icmp-source"]
+        protocols = [protocol.Protocol(protocol.specs.protocols[name]) for name in names]
+        template = protocols[0].get_template()
+        for p in protocols:
+            self.assertIs(p.get_template(), template)
+            self.assertEqual(template.fill(p.field_list.names), str(p))
+            self.assertEqual(protocols[0].render_labels(p.field_list.names), str(p))
+        for spec in ["A very long field name:3,B:64,C:1?bits=16", "A:8,B:96,C:5?bits=8,numbers=n",
+                     "Left:12,Right:40,Big:128,Tail:7"]:
+            p = protocol.Protocol(spec)
+            p.set_options({"do_left_to_right_print": False, "elide_rows": 1})
+            q = protocol.Protocol(spec.replace(":", "x:"))
+            q.set_options(p.get_options())
+            self.assertEqual(p.render_labels(q.field_list.names), str(q))
+        self.assertRaises(protocol.ProtocolException, template.fill, ["Type"])
+
+    def test_render_rows(self):
+        """
+        This function checks that rendering a window of rows or bits yields
+        the same lines as the full diagram, including continuation borders
+        and rows cut from fields that take several lines.
+        """
+        for spec in ["Field_32:32,Field_33:33,Field_39:39?numbers=0", "A:8,B:16,C:128,D:40,E:7?bits=16,numbers=0",
+                     "A:4,B:70,C:96,D:1?numbers=0,bits=8", "A:20,B:100?numbers=0"]:
+            p = protocol.Protocol(spec)
+            lines = str(p).split("\n")
+            rows = (len(lines) - 1) // 2
+            for start in range(0, rows + 1):
+                for end in range(start + 1, rows + 1):
+                    self.assertEqual(p.render_rows(start, end), "\n".join(lines[2 * start:2 * end + 1]))
+            bits = p.bits_per_line
+            self.assertEqual(p.render_range(bits + 1, 2 * bits), p.render_rows(1, 2))
+            self.assertEqual(p.render_rows(1, 1), "")
+            self.assertRaises(IndexError, p.render_rows, 0, rows + 1)
+            self.assertRaises(IndexError, p.render_range, 0, len(p.get_index()) + 1)
+
+    def test_measure(self):
+        """
+        This function checks that measure() predicts the size of the diagram
+        and that render_into() writes the same bytes as str() into a buffer.
+        """
+        for spec in [case[0] for case in validcases] + ["Cabecera:8,Información:40?bits=16,numbers=y"]:
+            p = protocol.Protocol(spec)
+            text = str(p)
+            lines = text.split("\n")
+            for encoding in ("utf-8", "utf-16"):
+                data = text.encode(encoding)
+                self.assertEqual(p.measure(encoding), (len(lines), max(len(line) for line in lines), len(data)))
+                buffer = bytearray(len(data) + 3)
+                self.assertEqual(p.render_into(buffer, 3, encoding), len(buffer))
+                self.assertEqual(bytes(buffer[3:]), data)
+                self.assertRaises(protocol.ProtocolException, p.render_into, buffer, 4, encoding)
+                self.assertEqual(protocol.estimate_size(p.field_list, p.get_options()), p.measure())
+        # Sizes follow from the field lengths, so huge diagrams are never laid out
+        p = protocol.Protocol("X:20000001?bits=2", protocol.RenderLimits(None, 1000, None, None))
+        self.assertEqual(p.measure(), (20000005, 5, 120000023))
+        self.assertRaises(protocol.ProtocolLimitException, p.measure, "utf-16")
+
+    def test_limits(self):
+        """
+        This function checks that specs over their resource limits are
+        rejected before rendering, both by the Protocol class and by the
+        module level render functions, and that specs within them render as
+        usual.
+        """
+        limits = protocol.RenderLimits(max_fields=20, max_rows=1000, max_bytes=50000, max_time=None)
+        huge = protocol.Protocol("X:999999999", limits)
+        self.assertRaises(protocol.ProtocolLimitException, str, huge)
+        self.assertRaises(protocol.ProtocolLimitException, huge.render_into, bytearray(10))
+        self.assertRaises(protocol.ProtocolLimitException, huge.render_rows, 0, 1000)
+        self.assertEqual(huge.render_rows(0, 1).count("\n"), 2)
+        self.assertRaises(protocol.ProtocolLimitException, protocol.Protocol, ",".join(["F:1"] * 21), limits)
+        self.assertRaises(protocol.ProtocolException, protocol.Protocol, "X:99999999999999999999999", limits)
+        tcp = protocol.Protocol(protocol.specs.protocols["tcp"], limits)
+        self.assertEqual(str(tcp), protocol.render("tcp"))
+        small = limits._replace(max_bytes=len(str(tcp)) - 1)
+        self.assertRaises(protocol.ProtocolLimitException, str, protocol.Protocol(protocol.specs.protocols["tcp"], small))
+        self.assertRaises(protocol.ProtocolLimitException, protocol.render, "tcp", limits=small)
+        results = protocol.render_many(["tcp", "X:999999999", "udp"], limits=limits)
+        self.assertIsInstance(results[1], protocol.ProtocolLimitException)
+        self.assertEqual(results[2], protocol.render("udp"))
+        slow = protocol.Protocol("X:%i" % (32 * 100000), limits._replace(max_rows=None, max_bytes=None, max_time=1e-6))
+        self.assertRaises(protocol.ProtocolLimitException, str, slow)
+
+    def test_field_index(self):
+        """
+        This function checks the bit offset queries: mapping bits to fields,
+        listing the fields in a bit range and finding the offset of a field.
+        """
+        p = protocol.Protocol(protocol.specs.protocols["ip"])
+        self.assertEqual(p.field_at(0).text, "Version")
+        self.assertEqual(p.field_at(4).text, "IHL")
+        self.assertEqual(p.field_at(95), p.field_at(80))
+        self.assertEqual(p.offset_of("Source Address"), 96)
+        self.assertEqual(p.field_at(96).end, 128)
+        self.assertEqual([f.text for f in p.fields_in_range(8, 33)], ["Type of Service", "Total Length", "Identification"])
+        self.assertEqual(p.fields_in_range(8, 8), [])
+        self.assertRaises(IndexError, p.field_at, 192)
+        self.assertRaises(IndexError, p.field_at, -1)
+        self.assertRaises(IndexError, p.fields_in_range, 0, 193)
+        self.assertRaises(KeyError, p.offset_of, "Nonexistent")
+        p.parse_spec("Extra:8")
+        self.assertEqual(p.field_at(192).text, "Extra")
+
+    def test_update(self):
+        """
+        This function checks that updating the spec of a protocol gives the
+        same result as parsing the new spec from scratch, and that the layout
+        of the fields before the first change is reused.
+        """
+        spec = "Source:16,Destination:16,Sequence:32,Options:70,Data:64,Checksum:16"
+        edits = ["Src:16,Destination:16,Sequence:32,Options:70,Data:64,Checksum:16",
+                 "Source:16,Destination:16,Sequence:32,Options:71,Data:64,Checksum:16",
+                 "Source:16,Destination:16,Sequence:32,Options:70,Data:64,Checksum:16,Pad:5",
+                 "Source:16,Destination:16,Sequence:32",
+                 "Source:16,Destination:16,Sequence:32,Options:70,Data:64,Checksum:16?bits=16,numbers=n",
+                 spec]
+        p = protocol.Protocol(spec)
+        str(p)
+        for new_spec in edits:
+            layout = p.compile()
+            changed = p.update(new_spec)
+            fresh = protocol.Protocol(new_spec)
+            self.assertEqual(str(p), str(fresh))
+            self.assertEqual(p.compile(), fresh.compile())
+            self.assertEqual(p.field_list, fresh.field_list)
+            self.assertEqual(p.offset_of("Sequence"), 32)
+            if p.get_options().bits_per_line == layout.bits_per_line:
+                self.assertEqual(p.compile().texts()[:changed], layout.texts()[:changed])
+        self.assertEqual(p.update(spec), 6)
+        self.assertRaises(protocol.ProtocolException, p.update, "Source:0")
+        self.assertEqual(str(p), str(protocol.Protocol(spec)))
+        # Options the new spec doesn't set go back to their defaults
+        p = protocol.Protocol("A:32,B:128?elide=0,numbers=0")
+        p.update("A:32,B:128?numbers=0")
+        self.assertEqual(str(p), str(protocol.Protocol("A:32,B:128?numbers=0")))
+
+    def test_field_list(self):
+        """
+        This function checks the compact field storage: sequence behaviour,
+        name interning and pickling.
+        """
+        p = protocol.Protocol("Flag:1,Flag:1,Reserved:30,Payload:70000")
+        self.assertEqual(len(p.field_list), 4)
+        self.assertEqual(p.field_list[3], protocol.Field("Payload", 70000))
+        self.assertEqual(p.field_list[3].len, 70000)
+        self.assertEqual(list(p.field_list[1:3]), [("Flag", 1), ("Reserved", 30)])
+        self.assertIs(p.field_list.names[0], p.field_list.names[1])
+        self.assertEqual(p.field_list.lengths.typecode, "I")
+        self.assertRaises(AttributeError, setattr, p.field_list, "names", ())
+        names = ["Field_%d" % (i % 10) for i in range(10000)]
+        fields = protocol.FieldList(names, [8] * len(names))
+        data = pickle.dumps(fields, protocol=pickle.HIGHEST_PROTOCOL)
+        self.assertLess(len(data), 4 * len(fields))
+        self.assertEqual(pickle.loads(data), fields)
+        copy = pickle.loads(pickle.dumps(p))
+        self.assertEqual(str(copy), str(p))
+        self.assertEqual(copy.field_list, p.field_list)
+
+    def test_render_tables(self):
+        """
+        This function checks that ruler and border tables are shared between
+        protocols with the same geometry, and that they match the original
+        per-object helpers.
+        """
+        p = protocol.Protocol("Field_16:16,Field_8:8?bits=16")
+        q = protocol.Protocol("Field_32:32?bits=16")
+        self.assertIs(p._get_tables(), q._get_tables())
+        self.assertEqual(p._get_top_numbers(), " 0                   1          \n 0 1 2 3 4 5 6 7 8 9 0 1 2 3 4 5")
+        self.assertEqual(p._get_horizontal(4), "+-+-+-+-+")
+        p.do_left_to_right_print = False
+        self.assertEqual(p._get_horizontal(4), " " * 24 + "+-+-+-+-+")
+        self.assertEqual(p._get_tables().border(4), "+-+-+-+-+")
+        self.assertEqual(p._get_top_numbers().split("\n")[1], " 5 4 3 2 1 0 9 8 7 6 5 4 3 2 1 0")
+
+    def test_row_memoization(self):
+        """
+        This function checks that identical rows are rendered once and shared
+        between diagrams, and that the row table stays bounded.
+        """
+        echo = protocol.Protocol(protocol.specs.protocols["icmp-echo"])
+        time = protocol.Protocol(protocol.specs.protocols["icmp-time"])
+        line = list(echo.iter_lines())[3]
+        self.assertEqual(line, "|      Type     |      Code     |            Checksum           |")
+        self.assertIs(list(time.iter_lines())[3], line)
+        expected = str(echo)
+        protocol.get_tables.cache_clear()
+        self.assertEqual(str(echo), expected)
+        # Wide rows don't stay in memory beyond the size bound
+        wide = protocol.Protocol(",".join("F%i:%i" % (i, 100+i) for i in range(0, 400)))
+        options = protocol.DEFAULT_OPTIONS._replace(bits_per_line=1024, ph_num_per_bit=8)
+        diagram = wide.render(options)
+        self.assertEqual(wide.render(options), diagram)
+        rows, chars = protocol.get_tables(options.bits_per_line, options.ph_num_per_bit,
+                                          options.hdr_char_start, options.hdr_char_end,
+                                          options.hdr_char_fill_odd, options.hdr_char_fill_even,
+                                          options.do_left_to_right_print).rows_size()
+        self.assertGreater(rows, 0)
+        self.assertLessEqual(chars, protocol.ROWS_CACHE_CHARS)
+        self.assertGreater(len(diagram), protocol.ROWS_CACHE_CHARS)
+
+    def test_iter_lines(self):
+        """
+        This function checks that the line generator and write_to() produce
+        exactly the same diagram as str().
+        """
+        for spec, expected in validcases:
+            p = protocol.Protocol(spec)
+            lines = p.iter_lines()
+            self.assertEqual(next(lines), expected.split("\n")[0])
+            self.assertEqual(list(lines), expected.split("\n")[1:])
+            out = io.StringIO()
+            p.write_to(out)
+            self.assertEqual(out.getvalue(), expected + "\n")
+
 if __name__ == '__main__':
     # Print our fancy ASCII header
     print("#########################################################################")